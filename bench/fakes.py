@@ -0,0 +1,244 @@
+"""In-process stand-ins for the Discord objects the bot handlers touch, plus an OMDb stub server.
+
+Every fake REST call sleeps for the configured latency and is counted, so a benchmark
+can report both timings and how many Discord API calls a scenario would have made.
+"""
+import asyncio
+import itertools
+from collections import Counter
+
+import discord
+from aiohttp import web
+
+_ids = itertools.count(10_000_000)
+
+
+class FakeDiscord:
+    """Shared latency setting and REST call counters for one benchmark run."""
+
+    def __init__(self, latency=0.05):
+        self.latency = latency
+        self.calls = Counter()
+
+    async def rest(self, route):
+        self.calls[route] += 1
+        await asyncio.sleep(self.latency)
+
+
+class FakeMessage:
+    def __init__(self, api, channel, content=None, embed=None, author=None):
+        self.api = api
+        self.id = next(_ids)
+        self.channel = channel
+        self.content = content or ''
+        self.embeds = [embed] if embed else []
+        self.author = author
+        self.guild = channel.guild
+        self.thread = None
+
+    async def edit(self, content=None, embed=None, **kwargs):
+        await self.api.rest('edit_message')
+        if content is not None:
+            self.content = content
+        if embed is not None:
+            self.embeds = [embed]
+        return self
+
+    async def delete(self, **kwargs):
+        await self.api.rest('delete_message')
+
+    async def clear_reactions(self):
+        await self.api.rest('clear_reactions')
+
+    async def create_thread(self, name, **kwargs):
+        await self.api.rest('create_thread')
+        self.thread = FakeThread(self.api, self.channel.guild, self.channel, thread_id=self.id, name=name)
+        self.channel.guild.threads[self.thread.id] = self.thread
+        return self.thread
+
+
+class FakeTextChannel:
+    def __init__(self, api, guild, channel_id=None):
+        self.api = api
+        self.guild = guild
+        self.id = channel_id or next(_ids)
+        self.name = 'peliculas'
+        self.messages = {}
+
+    async def send(self, content=None, embed=None, **kwargs):
+        await self.api.rest('send_message')
+        message = FakeMessage(self.api, self, content, embed)
+        self.messages[message.id] = message
+        return message
+
+    async def delete_messages(self, messages, **kwargs):
+        await self.api.rest('bulk_delete' if len(messages) > 1 else 'delete_message')
+
+    def get_partial_message(self, message_id):
+        return self.messages.get(message_id) or FakeMessage(self.api, self)
+
+    async def fetch_message(self, message_id):
+        await self.api.rest('fetch_message')
+        if message_id not in self.messages:
+            raise discord.NotFound(FakeHTTPResponse(404), 'Unknown Message')
+        return self.messages[message_id]
+
+
+class FakeThread(discord.Thread):
+    """A discord.Thread subclass so the handlers' isinstance checks pass."""
+
+    def __init__(self, api, guild, parent, thread_id=None, name='Reseñas'):
+        self.api = api
+        self.guild = guild
+        self.id = thread_id or next(_ids)
+        self.parent_id = parent.id
+        self.name = name
+
+    async def send(self, content=None, **kwargs):
+        await self.api.rest('send_message')
+        return FakeMessage(self.api, self, content)
+
+    async def delete_messages(self, messages, **kwargs):
+        await self.api.rest('bulk_delete' if len(messages) > 1 else 'delete_message')
+
+
+class FakeRole:
+    def __init__(self, role_id, members=()):
+        self.id = role_id
+        self.name = 'Cinéfilos'
+        self.members = list(members)
+
+
+class FakeGuild:
+    def __init__(self, guild_id=1):
+        self.id = guild_id
+        self.channels = {}
+        self.threads = {}
+        self.roles = {}
+
+    def get_channel(self, channel_id):
+        return self.channels.get(channel_id)
+
+    def get_thread(self, thread_id):
+        return self.threads.get(thread_id)
+
+    def get_role(self, role_id):
+        return self.roles.get(role_id)
+
+
+class FakeUser:
+    bot = False
+
+    def __init__(self, user_id):
+        self.id = user_id
+        self.display_name = f"usuario{user_id}"
+        self.name = self.display_name
+        self.mention = f"<@{user_id}>"
+
+
+class FakeReaction:
+    def __init__(self, message, emoji='👍'):
+        self.message = message
+        self.emoji = emoji
+
+
+class FakeResponse:
+    def __init__(self, api):
+        self.api = api
+        self.modal = None
+        self._done = False
+
+    def is_done(self):
+        return self._done
+
+    async def send_modal(self, modal):
+        await self.api.rest('interaction_callback')
+        self.modal = modal
+        self._done = True
+
+    async def send_message(self, *args, **kwargs):
+        await self.api.rest('interaction_callback')
+        self._done = True
+
+    async def defer(self, **kwargs):
+        await self.api.rest('interaction_callback')
+        self._done = True
+
+
+class FakeFollowup:
+    def __init__(self, api):
+        self.api = api
+
+    async def send(self, *args, **kwargs):
+        await self.api.rest('followup')
+
+
+class FakeInteraction:
+    def __init__(self, api, user, channel):
+        self.user = user
+        self.channel = channel
+        self.guild = channel.guild
+        self.response = FakeResponse(api)
+        self.followup = FakeFollowup(api)
+
+
+class FakeContext:
+    """Minimal commands.Context for calling a command callback directly."""
+
+    def __init__(self, api, guild, channel, author):
+        self.guild = guild
+        self.channel = channel
+        self.author = author
+        self.message = FakeMessage(api, channel, author=author)
+
+    async def send(self, content=None, **kwargs):
+        return await self.channel.send(content, **kwargs)
+
+
+class FakeHTTPResponse:
+    def __init__(self, status):
+        self.status = status
+        self.reason = 'fake'
+
+
+class OMDbStub:
+    """Local HTTP server that answers OMDb search (?s=) and detail (?i=) requests after a delay."""
+
+    def __init__(self, latency=0.2, total_results=50):
+        self.latency = latency
+        self.total_results = total_results
+        self.requests = 0
+        self._runner = None
+        self.url = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/', self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}/"
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+    async def _handle(self, request):
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        if 'i' in request.query:
+            imdb_id = request.query['i']
+            return web.json_response({
+                'Response': 'True', 'Title': f"Película {imdb_id}", 'Year': '2001',
+                'imdbID': imdb_id, 'Poster': 'N/A',
+            })
+        page = int(request.query.get('page', 1))
+        start = (page - 1) * 10
+        search = [
+            {'Title': f"{request.query['s']} {n}", 'Year': str(1980 + n % 40), 'imdbID': f"tt{9000000 + n}", 'Poster': 'N/A'}
+            for n in range(start, min(start + 10, self.total_results))
+        ]
+        if not search:
+            return web.json_response({'Response': 'False', 'Error': 'Movie not found!'})
+        return web.json_response({'Response': 'True', 'Search': search, 'totalResults': str(self.total_results)})
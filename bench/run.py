@@ -0,0 +1,275 @@
+"""Offline load benchmarks for the bot's hot paths.
+
+Drives the real handlers in nuni.py against the fake Discord layer and a local OMDb stub
+(bench/fakes.py), so no token, server or network access is needed:
+
+    python bench/run.py                                   # every scenario
+    python bench/run.py votes --voters 1000 --discord-latency 0.05
+    python bench/run.py lista --movies 500 --json results.json
+
+For each scenario it reports throughput, p50/p99 latency per operation, peak memory
+allocated while it ran (tracemalloc, measured in a second pass) and the Discord REST
+calls and OMDb requests it made.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from fakes import (FakeContext, FakeDiscord, FakeGuild, FakeInteraction, FakeMessage, FakeReaction,  # noqa: E402
+                   FakeRole, FakeTextChannel, FakeThread, FakeUser, OMDbStub)
+
+
+def import_bot(workdir):
+    """Imports nuni.py with its data files inside a throwaway directory."""
+    os.environ['NUNI_METRICS_PORT'] = '0'
+    os.chdir(workdir)
+    import nuni
+    # Los escenarios siembran el estado directamente, sin setup_hook
+    nuni.state_ready.set()
+    return nuni
+
+
+def build_guild(nuni, api):
+    guild = FakeGuild()
+    channel = FakeTextChannel(api, guild, nuni.PERMITTED_CHANNEL_ID)
+    guild.channels[channel.id] = channel
+    guild.roles[nuni.MOVIE_ROLE_ID] = FakeRole(nuni.MOVIE_ROLE_ID)
+    return guild, channel
+
+
+def seed_movies(nuni, api, guild, channel, count, votes_per_movie=0):
+    """Adds `count` rated movies (with their embed message and thread) straight into the store."""
+    threads = []
+    for n in range(count):
+        message = FakeMessage(api, channel, embed=nuni.build_movie_embed(f"Película {n}", None))
+        channel.messages[message.id] = message
+        thread = FakeThread(api, guild, channel, thread_id=message.id)
+        guild.threads[thread.id] = thread
+        imdb_id = f"tt{1000000 + n}"
+        record = nuni.new_movie_record(thread.id, f"Película {n}", str(1950 + n % 70), None,
+                                       message_id=message.id, channel_id=channel.id, guild_id=nuni.guild_key(guild.id))
+        record['rating_sum'] = votes_per_movie * (1 + n % 5)
+        record['rating_count'] = votes_per_movie
+        nuni.guild_movies(guild.id)[imdb_id] = record
+        nuni.movie_ids_by_thread[thread.id] = (record['guild_id'], imdb_id)
+        threads.append(thread)
+    return threads
+
+
+# --- Scenarios: each returns a list of zero-argument coroutine functions (one per operation) ---
+
+def scenario_votes(nuni, api, guild, channel, args, run):
+    """`--voters` users each click a rating button and submit the review modal, all at once."""
+    threads = seed_movies(nuni, api, guild, channel, args.threads)
+    view = nuni.MovieReviewView()
+
+    def voter(n):
+        async def op():
+            thread = threads[n % len(threads)]
+            user = FakeUser(run * 1_000_000 + n)
+            click = FakeInteraction(api, user, thread)
+            await view.handle_review(click, 1 + n % 5)
+            modal = click.response.modal
+            modal.review_text._value = "Una reseña de prueba para el benchmark."
+            await modal.on_submit(FakeInteraction(api, user, thread))
+        return op
+
+    return [voter(n) for n in range(args.voters)]
+
+
+def scenario_rating_updates(nuni, api, guild, channel, args, run):
+    """`--voters` concurrent update_average_rating calls spread over `--threads` threads."""
+    threads = seed_movies(nuni, api, guild, channel, args.threads, votes_per_movie=10)
+    return [lambda t=threads[n % len(threads)]: nuni.update_average_rating(t) for n in range(args.voters)]
+
+
+def scenario_rate(nuni, api, guild, channel, args, run):
+    """`--searches` concurrent `!rate <title>` runs that pick the first result (cold OMDb cache)."""
+    async def pick_first(*_, **__):
+        await asyncio.sleep(args.think_time)
+        return FakeMessage(api, channel, content='1')
+
+    nuni.bot.wait_for = pick_first
+
+    def search(n):
+        async def op():
+            ctx = FakeContext(api, guild, channel, FakeUser(n))
+            await nuni.rate_movie.callback(ctx, title=f"película {run}-{n}")
+        return op
+
+    return [search(n) for n in range(args.searches)]
+
+
+def scenario_lista(nuni, api, guild, channel, args, run):
+    """`--viewers` concurrent `!lista` runs over `--movies` movies, each paging through every page."""
+    seed_movies(nuni, api, guild, channel, args.movies, votes_per_movie=3)
+
+    def viewer(n):
+        async def op():
+            views = []
+
+            async def send(content=None, view=None, **kwargs):
+                views.append(view)
+                return await channel.send(content)
+
+            ctx = FakeContext(api, guild, channel, FakeUser(n))
+            ctx.send = send
+            await nuni.list_movies.callback(ctx)
+            view = views[0]
+            for page in range(1, view.page_count):
+                view.page = page
+                await view.render()
+            view.stop()
+        return op
+
+    return [viewer(n) for n in range(args.viewers)]
+
+
+def scenario_moderation(nuni, api, guild, channel, args, run):
+    """`--raiders` users each post `--raid-messages` stray messages and react to the movie embeds."""
+    threads = seed_movies(nuni, api, guild, channel, args.threads)
+
+    def raider(n):
+        async def op():
+            user = FakeUser(run * 1_000_000 + n)
+            for i in range(args.raid_messages):
+                target = channel if i % 2 else threads[i % len(threads)]
+                await nuni.on_message(FakeMessage(api, target, content="spam", author=user))
+            for thread in threads:
+                await nuni.on_reaction_add(FakeReaction(channel.messages[thread.id]), user)
+        return op
+
+    return [raider(n) for n in range(args.raiders)]
+
+
+SCENARIOS = {
+    'votes': scenario_votes,
+    'rating_updates': scenario_rating_updates,
+    'rate': scenario_rate,
+    'lista': scenario_lista,
+    'moderation': scenario_moderation,
+}
+
+
+async def run_ops(ops):
+    latencies = []
+
+    async def timed(op):
+        started = time.perf_counter()
+        await op()
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(timed(op) for op in ops))
+    return latencies, time.perf_counter() - started
+
+
+def percentile(values, pct):
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100)[pct - 1]
+
+
+async def run_scenario(nuni, name, args, stub):
+    api = FakeDiscord(args.discord_latency)
+    guild, channel = build_guild(nuni, api)
+    nuni.rated_movies.clear()
+    nuni.movie_ids_by_thread.clear()
+    nuni.rated_users_db.clear()
+    omdb_before = stub.requests
+
+    ops = SCENARIOS[name](nuni, api, guild, channel, args, run=0)
+    latencies, wall = await run_ops(ops)
+    await nuni.rating_updates.flush()
+    await nuni.moderation.flush()
+    await nuni.storage.flush()
+    rest_calls = dict(api.calls)
+    omdb_requests = stub.requests - omdb_before
+
+    # Segunda pasada, con usuarios nuevos, solo para medir memoria
+    tracemalloc.start()
+    ops = SCENARIOS[name](nuni, api, guild, channel, args, run=1)
+    baseline = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    await run_ops(ops)
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+    await nuni.rating_updates.flush()
+    await nuni.moderation.flush()
+    await nuni.storage.flush()
+
+    return {
+        'scenario': name,
+        'ops': len(latencies),
+        'wall_s': wall,
+        'throughput_ops_s': len(latencies) / wall if wall else 0.0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'peak_alloc_kib': peak / 1024,
+        'rest_calls': rest_calls,
+        'omdb_requests': omdb_requests,
+    }
+
+
+def print_report(results):
+    print(f"{'scenario':<16}{'ops':>7}{'ops/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'peak KiB':>11}{'REST':>8}{'OMDb':>7}")
+    for r in results:
+        print(f"{r['scenario']:<16}{r['ops']:>7}{r['throughput_ops_s']:>10.1f}{r['p50_ms']:>10.1f}{r['p99_ms']:>10.1f}"
+              f"{r['peak_alloc_kib']:>11.1f}{sum(r['rest_calls'].values()):>8}{r['omdb_requests']:>7}")
+    for r in results:
+        calls = ', '.join(f"{route}={count}" for route, count in sorted(r['rest_calls'].items()))
+        print(f"  {r['scenario']}: {calls}")
+
+
+async def main(args):
+    workdir = tempfile.mkdtemp(prefix='nuni-bench-')
+    nuni = import_bot(workdir)
+    stub = OMDbStub(latency=args.omdb_latency)
+    await stub.start()
+    nuni.omdb.base_url = stub.url
+    nuni.omdb.cache = None
+
+    results = []
+    try:
+        for name in args.scenarios or SCENARIOS:
+            results.append(await run_scenario(nuni, name, args, stub))
+    finally:
+        await nuni.storage.close()
+        await nuni.omdb.close()
+        await stub.stop()
+
+    print_report(results)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('scenarios', nargs='*', choices=[[], *SCENARIOS], help="Escenarios a ejecutar (todos por defecto)")
+    parser.add_argument('--voters', type=int, default=1000, help="Votantes simultáneos (votes, rating_updates)")
+    parser.add_argument('--threads', type=int, default=10, help="Hilos de reseñas entre los que se reparten los votos")
+    parser.add_argument('--searches', type=int, default=20, help="Búsquedas !rate simultáneas")
+    parser.add_argument('--movies', type=int, default=500, help="Películas calificadas para !lista")
+    parser.add_argument('--viewers', type=int, default=20, help="Usuarios simultáneos de !lista")
+    parser.add_argument('--raiders', type=int, default=50, help="Usuarios que inundan el canal (moderation)")
+    parser.add_argument('--raid-messages', type=int, default=10, help="Mensajes sueltos por usuario (moderation)")
+    parser.add_argument('--discord-latency', type=float, default=0.05, help="Latencia simulada de cada llamada REST (s)")
+    parser.add_argument('--omdb-latency', type=float, default=0.2, help="Latencia del stub de OMDb (s)")
+    parser.add_argument('--think-time', type=float, default=0.1, help="Tiempo que tarda el usuario en elegir en !rate (s)")
+    parser.add_argument('--json', help="Guarda los resultados en este archivo JSON")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,66 @@
+import json
+import time
+from collections import OrderedDict
+
+from storage import atomic_write_json
+
+
+class MetadataCache:
+    """Bounded LRU cache with per-entry expiry that can be persisted to a JSON file."""
+
+    def __init__(self, path, max_entries=5000):
+        self.path = path
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.dirty = False
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Returns the cached value, or None if it is missing or expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            self.dirty = True
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key, value, ttl):
+        """Stores a value for `ttl` seconds, evicting the least recently used entries."""
+        self._entries[key] = (time.time() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self.dirty = True
+
+    def snapshot(self):
+        """Returns a serializable copy of the live entries, oldest first."""
+        now = time.time()
+        return [[k, exp, v] for k, (exp, v) in self._entries.items() if exp > now]
+
+    def load(self):
+        """Loads the cache from disk, dropping expired entries."""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        now = time.time()
+        for key, expires_at, value in data[-self.max_entries:]:
+            if expires_at > now:
+                self._entries[key] = (expires_at, value)
+        self.dirty = False
+
+    def save(self, snapshot=None):
+        """Atomically writes the cache (or a previously taken snapshot) to disk."""
+        if snapshot is None:
+            snapshot = self.snapshot()
+        try:
+            atomic_write_json(self.path, snapshot, indent=None)
+        except OSError as e:
+            print(f"Error al guardar la caché de OMDb: {e}")
@@ -0,0 +1,62 @@
+import asyncio
+
+
+class Debouncer:
+    """Keeps at most one pending update per key and runs it a short delay after it is requested.
+
+    A request for a key that already has an update waiting replaces it, so only the latest
+    one reaches the API. Updates for the same key never overlap: one that comes due while
+    the previous one is still running waits for it to finish.
+    """
+
+    def __init__(self, delay=1.5, on_superseded=None):
+        self.delay = delay
+        self.on_superseded = on_superseded
+        self._pending = {}
+        self._tasks = {}
+        self._all_tasks = set()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def schedule(self, key, update):
+        """Queues `update` (a coroutine function) for `key`, replacing any update still waiting."""
+        if key in self._pending:
+            self._pending[key] = update
+            if self.on_superseded:
+                self.on_superseded()
+            return
+        self._pending[key] = update
+        task = asyncio.create_task(self._run(key, self._tasks.get(key)))
+        self._tasks[key] = task
+        self._all_tasks.add(task)
+        task.add_done_callback(self._all_tasks.discard)
+
+    async def flush(self):
+        """Runs every waiting update right away (used on shutdown)."""
+        pending, self._pending = self._pending, {}
+        waiting = {self._tasks.pop(key) for key in pending}
+        for task in waiting:
+            task.cancel()
+        running = self._all_tasks - waiting
+        if running:
+            await asyncio.wait(running)
+        await asyncio.gather(*(self._call(update) for update in pending.values()))
+
+    async def _run(self, key, previous):
+        await asyncio.sleep(self.delay)
+        if previous is not None and not previous.done():
+            await asyncio.wait([previous])
+        update = self._pending.pop(key, None)
+        try:
+            if update is not None:
+                await self._call(update)
+        finally:
+            if self._tasks.get(key) is asyncio.current_task():
+                del self._tasks[key]
+
+    async def _call(self, update):
+        try:
+            await update()
+        except Exception as e:
+            print(f"Error en una actualización diferida: {e}")
@@ -0,0 +1,192 @@
+import bisect
+import json
+import logging
+import time
+from contextlib import contextmanager
+
+from aiohttp import web
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_text(labelnames, values):
+    if not labelnames:
+        return ''
+    pairs = ','.join(f'{name}="{value}"' for name, value in zip(labelnames, values))
+    return '{' + pairs + '}'
+
+
+class Counter:
+    """Monotonic counter, optionally split by labels."""
+
+    kind = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in self.values.items():
+            yield self.name, _label_text(self.labelnames, labels), value
+
+    def to_json(self):
+        return {','.join(map(str, labels)) or 'total': value for labels, value in self.values.items()}
+
+
+class Gauge:
+    """Current value, either set explicitly or read from a callback at scrape time."""
+
+    kind = 'gauge'
+
+    def __init__(self, name, help, fn=None):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self):
+        yield self.name, '', self.fn() if self.fn else self.value
+
+    def to_json(self):
+        return self.fn() if self.fn else self.value
+
+
+class Histogram:
+    """Cumulative-bucket histogram of durations in seconds, optionally split by labels."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.series = {}
+
+    def observe(self, value, *labels):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        """Observes the time spent inside the `with` block (works around awaits too)."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def samples(self):
+        for labels, (counts, total, count) in self.series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                yield f"{self.name}_bucket", _label_text(self.labelnames + ('le',), labels + (le,)), cumulative
+            yield f"{self.name}_sum", _label_text(self.labelnames, labels), total
+            yield f"{self.name}_count", _label_text(self.labelnames, labels), count
+
+    def to_json(self):
+        return {
+            ','.join(map(str, labels)) or 'total': {'count': count, 'sum': total, 'avg': total / count if count else 0}
+            for labels, (_, total, count) in self.series.items()
+        }
+
+
+class Registry:
+    """Holds every metric and renders them in Prometheus text format or JSON."""
+
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, fn=None):
+        return self.register(Gauge(name, help, fn))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def render_prometheus(self):
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def render_json(self):
+        return json.dumps({name: metric.to_json() for name, metric in self.metrics.items()}, indent=2)
+
+
+REGISTRY = Registry()
+
+COMMAND_SECONDS = REGISTRY.histogram('nuni_command_seconds', 'Duración de los comandos.', ['command'])
+COMMAND_ERRORS = REGISTRY.counter('nuni_command_errors_total', 'Comandos que terminaron con error.', ['command', 'error'])
+INTERACTION_SECONDS = REGISTRY.histogram('nuni_interaction_seconds', 'Duración de botones y formularios.', ['kind'])
+OMDB_REQUESTS = REGISTRY.counter('nuni_omdb_requests_total', 'Peticiones HTTP a OMDb.', ['endpoint', 'outcome'])
+OMDB_SECONDS = REGISTRY.histogram('nuni_omdb_request_seconds', 'Latencia de OMDb, reintentos incluidos.', ['endpoint'])
+OMDB_CACHE = REGISTRY.counter('nuni_omdb_cache_total', 'Consultas a la caché de OMDb.', ['endpoint', 'result'])
+PERSIST_FLUSH_SECONDS = REGISTRY.histogram('nuni_persist_flush_seconds', 'Duración de cada guardado en disco.')
+PERSIST_FLUSHED = REGISTRY.counter('nuni_persist_flushed_changes_total', 'Cambios escritos en disco.', ['outcome'])
+RATING_EMBED_UPDATES = REGISTRY.counter('nuni_rating_embed_updates_total', 'Actualizaciones del embed de calificación.', ['path'])
+RATE_LIMITS = REGISTRY.counter('nuni_discord_rate_limits_total', 'Respuestas 429 de Discord.', ['source'])
+MODERATION_ACTIONS = REGISTRY.counter('nuni_moderation_actions_total', 'Llamadas de limpieza del canal (borrados, reacciones, avisos).', ['action'])
+METADATA_REFRESHES = REGISTRY.counter('nuni_metadata_refreshes_total', 'Películas completadas o actualizadas en segundo plano.', ['outcome'])
+THROTTLED = REGISTRY.counter('nuni_throttled_total', 'Mensajes y peticiones frenados por los límites propios.', ['scope', 'verdict'])
+
+
+class RateLimitLogHandler(logging.Handler):
+    """Counts the 429 warnings discord.py logs while it waits out a rate limit."""
+
+    def emit(self, record):
+        if 'rate limited' in record.getMessage():
+            RATE_LIMITS.inc('discord.http')
+
+
+class MetricsServer:
+    """Serves /metrics (Prometheus text format) and /metrics.json on a local port."""
+
+    def __init__(self, host='127.0.0.1', port=9108, registry=REGISTRY):
+        self.host = host
+        self.port = port
+        self.registry = registry
+        self._runner = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/metrics', self._prometheus)
+        app.router.add_get('/metrics.json', self._json)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logging.getLogger('discord.http').addHandler(RateLimitLogHandler())
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _prometheus(self, request):
+        return web.Response(text=self.registry.render_prometheus(), content_type='text/plain', charset='utf-8')
+
+    async def _json(self, request):
+        return web.Response(text=self.registry.render_json(), content_type='application/json')
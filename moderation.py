@@ -0,0 +1,132 @@
+import asyncio
+import time
+
+import discord
+
+from metrics import MODERATION_ACTIONS
+
+BULK_DELETE_LIMIT = 100
+WARNING_MENTIONS_LIMIT = 50
+
+
+class ModerationBatcher:
+    """Collects channel cleanup and applies it in bulk a short delay after the first request.
+
+    Stray messages are removed with one bulk-delete call per channel (up to 100 messages
+    each), all reactions on a message are cleared with a single call, and every user is
+    warned at most once per `warn_window` seconds; the users given the same kind of warning
+    in one flush share a single message per channel. `warnings` maps each kind to its text,
+    with a `{mentions}` placeholder.
+    """
+
+    def __init__(self, delay=1.0, warn_window=60.0, warnings=None, warning_ttl=10):
+        self.delay = delay
+        self.warn_window = warn_window
+        self.warnings = warnings or {}
+        self.warning_ttl = warning_ttl
+        self._deletes = {}
+        self._reactions = {}
+        self._warnings = {}
+        self._warned_at = {}
+        self._task = None
+
+    def __len__(self):
+        return sum(len(messages) for _, messages in self._deletes.values()) + len(self._reactions)
+
+    def delete(self, message):
+        """Queues a message for deletion."""
+        _, messages = self._deletes.setdefault(message.channel.id, (message.channel, {}))
+        messages[message.id] = message
+        self._schedule()
+
+    def clear_reactions(self, message):
+        """Queues the removal of every reaction on a message."""
+        self._reactions[message.id] = message
+        self._schedule()
+
+    def warn(self, channel, user, kind):
+        """Queues a `kind` warning for `user`, unless they were already warned within the window."""
+        now = time.monotonic()
+        if now - self._warned_at.get(user.id, float('-inf')) < self.warn_window:
+            MODERATION_ACTIONS.inc('warning_skipped')
+            return
+        self._warned_at[user.id] = now
+        _, users = self._warnings.setdefault((channel.id, kind), (channel, {}))
+        users[user.id] = user.mention
+        self._schedule()
+
+    def _schedule(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.delay)
+        self._task = None
+        await self.flush()
+
+    async def flush(self):
+        """Applies everything queued so far."""
+        deletes, self._deletes = self._deletes, {}
+        reactions, self._reactions = self._reactions, {}
+        warnings, self._warnings = self._warnings, {}
+        self._forget_old_warnings()
+
+        await asyncio.gather(
+            *(self._delete_messages(channel, list(messages.values())) for channel, messages in deletes.values()),
+            *(self._clear_reactions(message) for message in reactions.values()),
+            *(self._send_warning(channel, self.warnings[kind], list(users.values()))
+              for (_, kind), (channel, users) in warnings.items()),
+        )
+
+    async def stop(self):
+        """Cancels the pending timer and applies what is queued."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    def _forget_old_warnings(self):
+        cutoff = time.monotonic() - self.warn_window
+        for user_id in [u for u, warned_at in self._warned_at.items() if warned_at < cutoff]:
+            del self._warned_at[user_id]
+
+    async def _delete_messages(self, channel, messages):
+        for start in range(0, len(messages), BULK_DELETE_LIMIT):
+            chunk = messages[start:start + BULK_DELETE_LIMIT]
+            try:
+                await channel.delete_messages(chunk)
+                MODERATION_ACTIONS.inc('bulk_delete' if len(chunk) > 1 else 'delete')
+            except discord.NotFound:
+                pass
+            except discord.Forbidden:
+                print("Error: No tengo permisos para eliminar mensajes.")
+                return
+            except discord.HTTPException:
+                # El borrado masivo no acepta mensajes de más de 14 días: se borran uno a uno
+                for message in chunk:
+                    try:
+                        await message.delete()
+                        MODERATION_ACTIONS.inc('delete')
+                    except discord.HTTPException:
+                        pass
+
+    async def _clear_reactions(self, message):
+        try:
+            await message.clear_reactions()
+            MODERATION_ACTIONS.inc('clear_reactions')
+        except discord.NotFound:
+            pass
+        except discord.Forbidden:
+            print("Error: No tengo permisos para eliminar reacciones.")
+        except discord.HTTPException as e:
+            print(f"Ocurrió un error inesperado al intentar eliminar reacciones: {e}")
+
+    async def _send_warning(self, channel, text, mentions):
+        # Discord limita los mensajes a 2000 caracteres: una mención ocupa ~22
+        for start in range(0, len(mentions), WARNING_MENTIONS_LIMIT):
+            chunk = mentions[start:start + WARNING_MENTIONS_LIMIT]
+            try:
+                await channel.send(text.format(mentions=' '.join(chunk)), delete_after=self.warning_ttl)
+                MODERATION_ACTIONS.inc('warning')
+            except discord.HTTPException:
+                return
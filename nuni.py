@@ -2,9 +2,22 @@ import discord
 from discord.ext import commands
 import asyncio
 import re
-import requests
-import json
 import datetime
+import json
+import os
+import time
+
+from cache import MetadataCache
+from debounce import Debouncer
+from metrics import COMMAND_ERRORS, COMMAND_SECONDS, INTERACTION_SECONDS, RATING_EMBED_UPDATES, REGISTRY, THROTTLED, MetricsServer
+from moderation import ModerationBatcher
+from omdb import OMDbClient, OMDbError, OMDbThrottled
+from promotions import PromotionQueue
+from refresher import MetadataRefresher
+from search import STRONG_MATCH_SCORE, MovieSearchIndex
+from storage import new_movie_record, open_storage
+from throttle import ALLOWED, REJECTED, Throttle
+from votes import VoteRegistry
 
 # --- 1. Bot Configuration ---
 
@@ -12,121 +25,382 @@ intents = discord.Intents.default()
 intents.message_content = True
 intents.reactions = True
 
-bot = commands.Bot(command_prefix='!', intents=intents)
-
 MOVIE_ROLE_ID = 1418056361446473859
 PERMITTED_CHANNEL_ID = 1418107256997806230
 OMDB_API_KEY = '9ef031f7'
 
+# Multi-guild mode: guilds.json maps guild id -> {"channel_id": ..., "role_id": ...}.
+# Without it the bot serves a single server with the two IDs above.
+GUILD_CONFIG_FILE = 'guilds.json'
+
+# The server whose channel is PERMITTED_CHANNEL_ID keeps state partition 0, so data
+# stored before multi-guild mode stays attached to it.
+LEGACY_GUILD_KEY = 0
+
+# Sharding: NUNI_SHARD_COUNT shards in total, NUNI_SHARD_IDS (e.g. "0,1") run by this process.
+# NUNI_SHARDED=1 alone lets AutoShardedBot pick the shard count. Processes share the SQLite database.
+SHARD_COUNT = int(os.getenv('NUNI_SHARD_COUNT', '0')) or None
+SHARD_IDS = [int(i) for i in os.getenv('NUNI_SHARD_IDS', '').split(',') if i.strip()] or None
+SHARDED = os.getenv('NUNI_SHARDED') == '1' or SHARD_COUNT is not None
+
+# OMDb client settings (seconds / simultaneous requests / retries per request)
+OMDB_TIMEOUT = 10
+OMDB_MAX_CONCURRENCY = 4
+OMDB_RETRIES = 3
+
+# OMDb metadata cache (entries / seconds)
+OMDB_CACHE_FILE = 'omdb_cache.json'
+OMDB_CACHE_SIZE = 5000
+OMDB_DETAILS_TTL = 7 * 24 * 3600
+OMDB_SEARCH_TTL = 24 * 3600
+
+# Throttling with token buckets: RATE tokens per second, up to BURST at once.
+# Messages are limited per user and per channel before the bot does any work for them;
+# OMDb requests that miss the cache share one budget for the whole bot.
+USER_MESSAGE_RATE = 0.2
+USER_MESSAGE_BURST = 5
+CHANNEL_MESSAGE_RATE = 2.0
+CHANNEL_MESSAGE_BURST = 30
+OMDB_REQUEST_RATE = 1.0
+OMDB_REQUEST_BURST = 20
+
+user_throttle = Throttle(USER_MESSAGE_RATE, USER_MESSAGE_BURST)
+channel_throttle = Throttle(CHANNEL_MESSAGE_RATE, CHANNEL_MESSAGE_BURST)
+omdb_throttle = Throttle(OMDB_REQUEST_RATE, OMDB_REQUEST_BURST)
+
+omdb_cache = MetadataCache(OMDB_CACHE_FILE, max_entries=OMDB_CACHE_SIZE)
+omdb_cache.load()
+omdb = OMDbClient(
+    OMDB_API_KEY, timeout=OMDB_TIMEOUT, max_concurrency=OMDB_MAX_CONCURRENCY, retries=OMDB_RETRIES,
+    cache=omdb_cache, details_ttl=OMDB_DETAILS_TTL, search_ttl=OMDB_SEARCH_TTL, throttle=omdb_throttle
+)
+
+
+def load_guild_configs():
+    """Reads the per-guild channel/role configuration, if any."""
+    try:
+        with open(GUILD_CONFIG_FILE, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}
+    return {int(guild_id): {'channel_id': int(c['channel_id']), 'role_id': int(c['role_id'])} for guild_id, c in data.items()}
+
+guild_configs = load_guild_configs()
+
+
+class NuniBot(commands.AutoShardedBot if SHARDED else commands.Bot):
+    state_task = None
+
+    async def setup_hook(self):
+        """Runs once per process: starts loading the stored state and registers the persistent views."""
+        # La carga corre en un hilo mientras se conecta al gateway; lo que dependa de ella espera a state_ready
+        self.state_task = asyncio.create_task(load_initial_state())
+        self.add_view(MovieReviewView())
+        promotions.load()
+        promotions.start()
+        if METRICS_PORT:
+            try:
+                await metrics_server.start()
+            except OSError as e:
+                print(f"No se pudo iniciar el servidor de métricas en el puerto {METRICS_PORT}: {e}")
+
+    async def close(self):
+        """Releases the shared OMDb connection pool and the storage backend before disconnecting."""
+        await promotions.stop()
+        await metadata_refresher.stop()
+        await rating_updates.flush()
+        await moderation.stop()
+        await metrics_server.stop()
+        await omdb.close()
+        await super().close()
+        # La carga inicial usa la base desde un hilo: se espera a que termine antes de cerrarla
+        if self.state_task is not None and self.state_task is not asyncio.current_task():
+            await asyncio.wait([self.state_task])
+        await storage.close()
+
+
+shard_options = {'shard_count': SHARD_COUNT, 'shard_ids': SHARD_IDS} if SHARDED else {}
+bot = NuniBot(command_prefix='!', intents=intents, **shard_options)
+
+# Promotion DMs: queue file and pause between DMs (seconds, adapted to Discord's rate limits).
+# Each sharded process keeps its own queue, since it only serves its own guilds.
+PROMOTIONS_FILE = f"promotions_queue.shard-{'-'.join(map(str, SHARD_IDS))}.json" if SHARD_IDS else 'promotions_queue.json'
+PROMOTION_DELAY = 1.0
+
+promotions = PromotionQueue(bot, PROMOTIONS_FILE, delay=PROMOTION_DELAY)
+
+# Rating embed edits: votes arriving within this many seconds share a single edit per message
+RATING_UPDATE_DELAY = 1.5
+
+rating_updates = Debouncer(RATING_UPDATE_DELAY, on_superseded=lambda: RATING_EMBED_UPDATES.inc('coalesced'))
+
+# Channel cleanup: stray messages and reactions are removed in bulk this many seconds after
+# the first one, and each user gets at most one warning per window (seconds)
+MODERATION_DELAY = 1.0
+MODERATION_WARN_WINDOW = 60
+
+moderation = ModerationBatcher(MODERATION_DELAY, MODERATION_WARN_WINDOW, warnings={
+    'rules': "❌ {mentions} Para interactuar en este canal, por favor usa los comandos permitidos (`!rate`, `!buscar`, `!lista`).",
+    'throttled': "⏳ {mentions} vas demasiado rápido. Espera unos segundos.",
+})
+
+# Background OMDb refresh: fills in untitled movies and refreshes expired metadata,
+# most recently viewed first, with at most this many OMDb requests per day (UTC)
+METADATA_REFRESH_DAILY_QUOTA = 300
+METADATA_REFRESH_PAUSE = 5.0
+
+metadata_refresher = MetadataRefresher(
+    omdb, lambda: all_rated_movies(), lambda imdb_id, record, data: apply_movie_metadata(imdb_id, record, data),
+    daily_quota=METADATA_REFRESH_DAILY_QUOTA, pause=METADATA_REFRESH_PAUSE
+)
+
+# Metrics: Prometheus text on http://127.0.0.1:<port>/metrics and JSON on /metrics.json (0 disables)
+METRICS_HOST = '127.0.0.1'
+METRICS_PORT = int(os.getenv('NUNI_METRICS_PORT', '9108'))
+
+metrics_server = MetricsServer(METRICS_HOST, METRICS_PORT)
+REGISTRY.gauge('nuni_promotion_queue_depth', 'Mensajes de promoción pendientes.', fn=lambda: len(promotions.pending))
+REGISTRY.gauge('nuni_metadata_refresh_quota_used', 'Peticiones a OMDb del refresco en segundo plano hoy.', fn=lambda: metadata_refresher.used_today)
+REGISTRY.gauge('nuni_rating_updates_pending', 'Ediciones de embed de calificación en espera.', fn=lambda: len(rating_updates))
+
+# !rate searches at most this many OMDb result pages (10 movies each)
+SEARCH_MAX_PAGES = 5
+
+# !lista pagination: movies per page and seconds before the list is removed
+LIST_PAGE_SIZE = 10
+LIST_TIMEOUT = 120
+
 # File names for persistent data
 RATED_MOVIES_DB_FILE = 'rated_movies_db.json'
 RATED_USERS_DB_FILE = 'rated_users_db.json'
+DATABASE_FILE = 'nuni.db'
+# Binary snapshot of who voted where, so startup does not have to read the whole votes table
+VOTES_SNAPSHOT_FILE = 'votes.bin'
+
+# 'sqlite' (default) or 'json' for the legacy whole-file backend.
+# The SQLite backend imports the JSON files above the first time it runs.
+STORAGE_BACKEND = os.getenv('NUNI_STORAGE', 'sqlite')
+
+# Write-behind persistence: flush at most every N seconds, or sooner once this many changes are pending
+PERSIST_FLUSH_INTERVAL = 2.0
+PERSIST_MAX_PENDING = 100
 
+storage = open_storage(
+    STORAGE_BACKEND, DATABASE_FILE, RATED_MOVIES_DB_FILE, RATED_USERS_DB_FILE,
+    flush_interval=PERSIST_FLUSH_INTERVAL, max_pending=PERSIST_MAX_PENDING, votes_snapshot_path=VOTES_SNAPSHOT_FILE,
+    sharded=SHARDED
+)
+
+# Movie state is partitioned by guild (see guild_key); votes are keyed by thread, which is unique
 rated_movies = {}
-rated_users_db = {}
+rated_users_db = VoteRegistry()
+movie_ids_by_thread = {}
+search_indexes = {}
+
+REGISTRY.gauge('nuni_rated_movies', 'Películas calificadas en memoria.', fn=lambda: sum(map(len, rated_movies.values())))
+REGISTRY.gauge('nuni_persist_pending_changes', 'Cambios pendientes de guardar.', fn=lambda: storage.pending_changes)
+
+# Matches the rating line of the review messages the bot posts in each thread
+REVIEW_RATING_PATTERN = re.compile(r'\*\*Calificación:\*\* ⭐+\s\((\d)/5\)')
 
 # --- 2. Helper Functions and Checks ---
 
+def guild_config(guild_id):
+    """Returns the permitted channel and movie role of a guild."""
+    return guild_configs.get(guild_id) or {'channel_id': PERMITTED_CHANNEL_ID, 'role_id': MOVIE_ROLE_ID}
+
+def guild_key(guild_id):
+    """Returns the state partition of a guild."""
+    if guild_config(guild_id)['channel_id'] == PERMITTED_CHANNEL_ID:
+        return LEGACY_GUILD_KEY
+    return guild_id
+
+def guild_movies(guild_id):
+    """Returns the imdbID -> record dict of a guild."""
+    return rated_movies.setdefault(guild_key(guild_id), {})
+
+def guild_search_index(guild_id):
+    """Returns the local !buscar index of a guild."""
+    return search_indexes.setdefault(guild_key(guild_id), MovieSearchIndex())
+
 def is_in_specific_channel(ctx):
     """Verifies if the command is used in the permitted channel."""
-    return ctx.channel.id == PERMITTED_CHANNEL_ID
+    return ctx.guild is not None and ctx.channel.id == guild_config(ctx.guild.id)['channel_id']
+
+def has_movie_role(ctx):
+    """Verifies that the author has the guild's movie role."""
+    role_id = guild_config(ctx.guild.id)['role_id'] if ctx.guild else MOVIE_ROLE_ID
+    if not isinstance(ctx.author, discord.Member) or ctx.author.get_role(role_id) is None:
+        raise commands.MissingRole(role_id)
+    return True
 
 def load_rated_movies():
-    """Loads rated movies from the JSON file."""
-    global rated_movies
-    try:
-        with open(RATED_MOVIES_DB_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            rated_movies = {k: int(v) for k, v in data.items()}
-    except (FileNotFoundError, json.JSONDecodeError):
-        rated_movies = {}
+    """Reads rated movies from the storage backend into new per-guild and by-thread maps."""
+    movies = {}
+    ids_by_thread = {}
+    for imdb_id, record in storage.load_movies():
+        movies.setdefault(record['guild_id'], {})[imdb_id] = record
+        ids_by_thread[record['thread_id']] = (record['guild_id'], imdb_id)
+    return movies, ids_by_thread
 
-def save_rated_movies():
-    """Saves rated movies to the JSON file."""
-    try:
-        with open(RATED_MOVIES_DB_FILE, 'w', encoding='utf-8') as f:
-            json.dump(rated_movies, f, indent=4)
-    except Exception as e:
-        print(f"Error al guardar la base de datos de películas calificadas: {e}")
+def build_search_index(movies, ids_by_thread):
+    """Builds new !buscar indexes from the given rated movies and their stored reviews."""
+    indexes = {}
+    for key, records in movies.items():
+        index = indexes[key] = MovieSearchIndex()
+        for imdb_id, record in records.items():
+            if record.get('title'):
+                index.add_movie(imdb_id, record['title'], record.get('year'))
+    for thread_id, review in storage.load_reviews():
+        if thread_id in ids_by_thread:
+            key, imdb_id = ids_by_thread[thread_id]
+            indexes[key].add_review(imdb_id, review)
+    return indexes
 
-def load_rated_users():
-    """Loads rated users from the JSON file."""
-    global rated_users_db
-    try:
-        with open(RATED_USERS_DB_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            rated_users_db = {int(k): set(v) for k, v in data.items()}
-    except (FileNotFoundError, json.JSONDecodeError):
-        rated_users_db = {}
+# Set once the stored movies and votes are in memory; handlers that use them wait for it
+state_ready = asyncio.Event()
+
+def read_state():
+    """Reads movies, votes and the search indexes from storage (runs in a worker thread).
+
+    Everything is built into new objects; the live state is only replaced once all of it loaded.
+    """
+    movies, ids_by_thread = load_rated_movies()
+    votes = storage.load_votes()
+    indexes = build_search_index(movies, ids_by_thread)
+    return movies, ids_by_thread, votes, indexes
+
+async def load_state():
+    """Loads the stored state off the event loop; interactions and commands wait until it is done.
 
-def save_rated_users():
-    """Saves rated users to the JSON file."""
+    The caller clears state_ready beforehand; it is only set once the new state is in place,
+    so if the read fails it stays clear.
+    """
+    global rated_movies, movie_ids_by_thread, rated_users_db, search_indexes
+    started = time.perf_counter()
+    loaded = await asyncio.to_thread(read_state)
+    rated_movies, movie_ids_by_thread, rated_users_db, search_indexes = loaded
+    state_ready.set()
+    print(f"Datos cargados en {time.perf_counter() - started:.2f}s: {sum(map(len, rated_movies.values()))} películas "
+          f"y {len(rated_users_db)} hilos con votos.")
+
+async def load_initial_state():
+    """Startup load; without the stored votes the bot could accept duplicates, so a failure stops it."""
     try:
-        with open(RATED_USERS_DB_FILE, 'w', encoding='utf-8') as f:
-            data = {str(k): list(v) for k, v in rated_users_db.items()}
-            json.dump(data, f, indent=4)
+        await load_state()
     except Exception as e:
-        print(f"Error al guardar la base de datos de usuarios calificados: {e}")
+        print(f"Error al cargar los datos guardados, el bot se detiene: {e}")
+        await bot.close()
+        return
+    metadata_refresher.start()
 
-async def update_average_rating(channel):
-    """Calculates and updates the average rating in the main message."""
-    if not isinstance(channel, discord.Thread):
+def get_movie_by_thread(thread_id):
+    """Returns the rated-movie record for a review thread, or None."""
+    if thread_id not in movie_ids_by_thread:
+        return None
+    key, imdb_id = movie_ids_by_thread[thread_id]
+    return rated_movies.get(key, {}).get(imdb_id)
+
+def record_rating(thread_id, rating):
+    """Adds a vote to the thread's running rating totals."""
+    record = get_movie_by_thread(thread_id)
+    if record is None:
         return
+    record['rating_sum'] += rating
+    record['rating_count'] += 1
+    storage.save_rating(thread_id, record['rating_sum'], record['rating_count'])
 
-    ratings = []
-    try:
-        main_channel = channel.parent
-        async for msg in main_channel.history(limit=50):
-            if msg.thread and msg.thread.id == channel.id:
-                original_message = msg
-                break
-        else:
-            return
+def average_rating(record):
+    """Returns a movie's average rating, or None if nobody has voted yet."""
+    if not record['rating_count']:
+        return None
+    return record['rating_sum'] / record['rating_count']
 
-    except (discord.NotFound, discord.HTTPException):
+def apply_movie_metadata(imdb_id, record, movie_data):
+    """Copies title, year and poster from an OMDb record into a rated movie, saving only real changes."""
+    poster = movie_data.get('Poster', record.get('poster'))
+    metadata = {
+        'title': movie_data.get('Title') or record.get('title'),
+        'year': movie_data.get('Year') or record.get('year'),
+        'poster': None if poster == 'N/A' else poster,
+    }
+    if all(record.get(field) == value for field, value in metadata.items()):
         return
+    record.update(metadata)
+    storage.save_movie(imdb_id, record)
+    search_indexes.setdefault(record['guild_id'], MovieSearchIndex()).add_movie(imdb_id, record['title'], record['year'])
 
-    # Iterate through all messages in the thread to find reviews
-    async for message in channel.history(limit=100):
-        # Check for review messages sent by the bot after a modal submission
-        if message.author == bot.user and message.content:
-            match = re.search(r'\*\*Calificación:\*\* ⭐+\s\((\d)/5\)', message.content)
-            if match:
-                rating = int(match.group(1))
-                if 1 <= rating <= 5:
-                    ratings.append(rating)
-    
-    embed = original_message.embeds[0]
-    if ratings:
-        average_rating = sum(ratings) / len(ratings)
+def all_rated_movies():
+    """Yields (guild key, imdb_id, record) for every rated movie of every guild."""
+    for key, movies in list(rated_movies.items()):
+        for imdb_id, record in list(movies.items()):
+            yield key, imdb_id, record
+
+def apply_rating_to_embed(embed, rating_sum, rating_count):
+    """Writes the average rating into a movie review embed."""
+    if rating_count:
+        average_rating = rating_sum / rating_count
         stars = '⭐' * int(round(average_rating))
-        
+
         embed.set_field_at(0, name="Calificación", value=f"{stars} ({average_rating:.2f}/5)", inline=False)
         embed.description = f"Hasta ahora el rating de esta película es: {average_rating:.2f}/5\n¡Vota y deja tu reseña haciendo clic en los botones de abajo!"
     else:
         embed.set_field_at(0, name="Calificación", value="Sin calificar aún", inline=False)
         embed.description = "¡Sé el primero en calificar esta película! Haz clic en los botones de abajo para votar y dejar tu reseña."
 
-    await original_message.edit(embed=embed)
+def build_movie_embed(title, poster_url, rating_sum=0, rating_count=0):
+    """Builds the main review embed for a movie."""
+    embed = discord.Embed(title=f"🎬 Reseña para '{title}'", color=discord.Color.gold())
+    embed.add_field(name="Calificación", value="Sin calificar aún", inline=False)
+    apply_rating_to_embed(embed, rating_sum, rating_count)
+
+    if poster_url:
+        embed.set_image(url=poster_url)
+    return embed
+
+async def update_average_rating(channel):
+    """Updates the average rating in the main message from the thread's running totals."""
+    if not isinstance(channel, discord.Thread):
+        return
+
+    record = get_movie_by_thread(channel.id)
+    main_channel = channel.parent
+    if record is None or main_channel is None:
+        return
+
+    try:
+        if record.get('title'):
+            # El embed se reconstruye desde el registro: una sola llamada, sin leer el canal
+            embed = build_movie_embed(record['title'], record.get('poster'), record['rating_sum'], record['rating_count'])
+            await main_channel.get_partial_message(record['message_id']).edit(embed=embed)
+            RATING_EMBED_UPDATES.inc('partial')
+        else:
+            original_message = await main_channel.fetch_message(record['message_id'])
+            embed = original_message.embeds[0]
+            apply_rating_to_embed(embed, record['rating_sum'], record['rating_count'])
+            await original_message.edit(embed=embed)
+            RATING_EMBED_UPDATES.inc('fetch')
+    except (discord.NotFound, discord.HTTPException):
+        RATING_EMBED_UPDATES.inc('failed')
+        return
+
+
+def schedule_rating_update(channel):
+    """Queues a debounced embed refresh; bursts of votes on one movie end up as a single edit."""
+    record = get_movie_by_thread(channel.id) if isinstance(channel, discord.Thread) else None
+    if record is None:
+        return
+    rating_updates.schedule(record['message_id'], lambda: update_average_rating(channel))
 
 
 async def send_movie_promotion(guild, thread_url, movie_name):
-    """Sends a DM to all members with the movie role."""
-    movie_role = guild.get_role(MOVIE_ROLE_ID)
+    """Queues a promotion DM for all members with the movie role."""
+    movie_role = guild.get_role(guild_config(guild.id)['role_id'])
     if not movie_role:
         print("Error: No se pudo encontrar el rol de película. Verifica el ID.")
         return
 
-    for member in movie_role.members:
-        if member.bot:
-            continue
-        try:
-            await member.send(f"Hola, hemos visto que tienes el rol de **{movie_role.name}**.\n\n"
-                                 f"¿Ya viste y calificaste **'{movie_name}'**?\n\n"
-                                 f"¡Es tu momento de dejar tu reseña! Puedes hacerlo directamente aquí: {thread_url}")
-            await asyncio.sleep(1)
-        except (discord.Forbidden, Exception):
-            pass
+    await promotions.enqueue(movie_role.members, movie_role.name, movie_name, thread_url)
 
 async def create_movie_review_thread(channel, author, movie_data):
     """Creates a review thread with movie details."""
@@ -137,16 +411,9 @@ async def create_movie_review_thread(channel, author, movie_data):
     if poster_url == 'N/A':
         poster_url = None
 
-    embed = discord.Embed(
-        title=f"🎬 Reseña para '{movie_title}'",
-        description="¡Haz clic en el hilo de abajo para calificar y dejar tu reseña!",
-        color=discord.Color.gold()
-    )
-    embed.add_field(name="Calificación", value="Sin calificar aún", inline=False)
+    embed = build_movie_embed(movie_title, poster_url)
+    embed.description = "¡Haz clic en el hilo de abajo para calificar y dejar tu reseña!"
 
-    if poster_url:
-        embed.set_image(url=poster_url)
-    
     message = await channel.send(embed=embed)
     thread_name = f"Reseñas para {movie_title[:20]}..." if len(movie_title) > 20 else f"Reseñas para {movie_title}"
     
@@ -155,8 +422,20 @@ async def create_movie_review_thread(channel, author, movie_data):
         buttons_message = await thread.send("Por favor, usa los botones para calificar esta película:", view=MovieReviewView())
         
         if imdb_id:
-            rated_movies[imdb_id.lower().strip()] = thread.id
-            save_rated_movies()
+            record = new_movie_record(
+                thread.id,
+                title=movie_title,
+                year=movie_data.get('Year'),
+                poster=poster_url,
+                created_at=datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                message_id=message.id,
+                channel_id=channel.id,
+                guild_id=guild_key(channel.guild.id)
+            )
+            guild_movies(channel.guild.id)[imdb_id.lower().strip()] = record
+            movie_ids_by_thread[thread.id] = (record['guild_id'], imdb_id.lower().strip())
+            storage.save_movie(imdb_id.lower().strip(), record)
+            guild_search_index(channel.guild.id).add_movie(imdb_id.lower().strip(), movie_title, record['year'])
             await send_movie_promotion(channel.guild, thread.jump_url, movie_title)
             
     except discord.Forbidden:
@@ -191,25 +470,30 @@ class MovieReviewView(discord.ui.View):
         await self.handle_review(interaction, 5)
 
     async def handle_review(self, interaction: discord.Interaction, rating: int):
-        user_id = interaction.user.id
-        thread_id = interaction.channel.id
+        if not state_ready.is_set():
+            # Discord descarta la interacción si no se responde en 3 s: no se puede esperar a la carga
+            await interaction.response.send_message("⏳ Cargando datos, intenta de nuevo en unos segundos.", ephemeral=True, delete_after=5)
+            return
+        with INTERACTION_SECONDS.time('review_button'):
+            user_id = interaction.user.id
+            thread_id = interaction.channel.id
 
-        if user_id in rated_users_db.get(thread_id, set()):
+            if rated_users_db.has_voted(thread_id, user_id):
+                try:
+                    # Intenta enviar una respuesta efímera para notificar al usuario
+                    await interaction.response.send_message("❌ Ya has dejado una reseña en este hilo. Solo se permite una por usuario.", ephemeral=True, delete_after=5)
+                except discord.errors.InteractionResponded:
+                    # Ignora el error si la interacción ya ha sido respondida, lo que evita el traceback
+                    pass
+                return
+
+            # El bot no necesita deshabilitar los botones, ya que cada interacción se gestiona individualmente.
             try:
-                # Intenta enviar una respuesta efímera para notificar al usuario
-                await interaction.response.send_message("❌ Ya has dejado una reseña en este hilo. Solo se permite una por usuario.", ephemeral=True, delete_after=5)
+                await interaction.response.send_modal(MovieReviewModal(rating))
             except discord.errors.InteractionResponded:
-                # Ignora el error si la interacción ya ha sido respondida, lo que evita el traceback
+                # Captura y maneja el error si la interacción ya fue respondida, lo que podría pasar
+                # si el usuario presiona los botones muy rápido.
                 pass
-            return
-            
-        # El bot no necesita deshabilitar los botones, ya que cada interacción se gestiona individualmente.
-        try:
-            await interaction.response.send_modal(MovieReviewModal(rating))
-        except discord.errors.InteractionResponded:
-            # Captura y maneja el error si la interacción ya fue respondida, lo que podría pasar
-            # si el usuario presiona los botones muy rápido.
-            pass
 
 
 class MovieReviewModal(discord.ui.Modal):
@@ -226,35 +510,176 @@ class MovieReviewModal(discord.ui.Modal):
         self.add_item(self.review_text)
 
     async def on_submit(self, interaction: discord.Interaction):
-        thread_id = interaction.channel.id
-        user_id = interaction.user.id
-        
-        rated_users_db.setdefault(thread_id, set()).add(user_id)
-        save_rated_users()
-        
-        await interaction.response.defer(ephemeral=True)
-        review_description = self.review_text.value
-        stars = '⭐' * self.rating
-        review_message_content = (
-            f"**Reseña de {interaction.user.display_name}:**\n"
-            f"{review_description}\n"
-            f"**Calificación:** {stars} ({self.rating}/5)"
-        )
-        try:
-            await interaction.channel.send(content=review_message_content)
-        except (discord.Forbidden, Exception):
-            pass
-        await update_average_rating(interaction.channel)
+        if not state_ready.is_set():
+            # Se confirma ya (límite de 3 s de Discord) y la reseña se procesa al terminar la carga
+            await interaction.response.defer(ephemeral=True)
+            await state_ready.wait()
+        with INTERACTION_SECONDS.time('review_modal'):
+            thread_id = interaction.channel.id
+            user_id = interaction.user.id
+
+            if not rated_users_db.add(thread_id, user_id):
+                # Dos formularios abiertos a la vez: solo cuenta el primero que se envía
+                message = "❌ Ya has dejado una reseña en este hilo. Solo se permite una por usuario."
+                if interaction.response.is_done():
+                    await interaction.followup.send(message, ephemeral=True)
+                else:
+                    await interaction.response.send_message(message, ephemeral=True, delete_after=5)
+                return
+            storage.save_vote(thread_id, user_id, self.rating, self.review_text.value)
+            record_rating(thread_id, self.rating)
+            if thread_id in movie_ids_by_thread:
+                key, imdb_id = movie_ids_by_thread[thread_id]
+                search_indexes.setdefault(key, MovieSearchIndex()).add_review(imdb_id, self.review_text.value)
+
+            if not interaction.response.is_done():
+                await interaction.response.defer(ephemeral=True)
+            review_description = self.review_text.value
+            stars = '⭐' * self.rating
+            review_message_content = (
+                f"**Reseña de {interaction.user.display_name}:**\n"
+                f"{review_description}\n"
+                f"**Calificación:** {stars} ({self.rating}/5)"
+            )
+            try:
+                await interaction.channel.send(content=review_message_content)
+            except (discord.Forbidden, Exception):
+                pass
+            schedule_rating_update(interaction.channel)
+
+class MovieListView(discord.ui.View):
+    """Paginated !lista; each page is rendered from the local store only when it is shown."""
+
+    SORTS = {
+        'recientes': "Más recientes primero",
+        'antiguas': "Más antiguas primero",
+        'mejor': "Mejor calificadas primero",
+    }
+    FILTERS = {
+        '0': "Todas las películas",
+        '3': "Solo 3⭐ o más",
+        '4': "Solo 4⭐ o más",
+    }
+
+    def __init__(self, author_id, guild_id, page_size=None):
+        super().__init__(timeout=LIST_TIMEOUT)
+        self.author_id = author_id
+        self.guild_id = guild_id
+        self.page_size = page_size or LIST_PAGE_SIZE
+        self.sort = 'recientes'
+        self.min_rating = 0
+        self.page = 0
+        self.message = None
+        self.imdb_ids = []
+        self._apply_sort_and_filter()
+
+    @property
+    def page_count(self):
+        return max(1, -(-len(self.imdb_ids) // self.page_size))
+
+    def _apply_sort_and_filter(self):
+        # Solo se ordenan IDs locales; el texto de cada página se arma al mostrarla
+        movies = guild_movies(self.guild_id)
+        imdb_ids = list(movies)
+        if self.min_rating:
+            imdb_ids = [i for i in imdb_ids if (average_rating(movies[i]) or 0) >= self.min_rating]
+        if self.sort == 'recientes':
+            imdb_ids.reverse()
+        elif self.sort == 'mejor':
+            imdb_ids.sort(key=lambda i: average_rating(movies[i]) or 0, reverse=True)
+        self.imdb_ids = imdb_ids
+        self.page = 0
+
+    async def render(self):
+        """Builds the text of the current page and updates the button states."""
+        self.previous_page.disabled = self.page == 0
+        self.next_page.disabled = self.page >= self.page_count - 1
+
+        lines = [f"**🎥 Películas calificadas** (página {self.page + 1}/{self.page_count} · {len(self.imdb_ids)} películas)\n"]
+        movies = guild_movies(self.guild_id)
+        start = self.page * self.page_size
+        for imdb_id in self.imdb_ids[start:start + self.page_size]:
+            record = movies.get(imdb_id)
+            if record is None:
+                continue
+            # Los datos que falten los completa metadata_refresher, con prioridad para lo que se ve
+            metadata_refresher.mark_viewed(guild_key(self.guild_id), imdb_id, record)
+
+            thread_url = f"https://discord.com/channels/{self.guild_id}/{record['thread_id']}"
+            average = average_rating(record)
+            rating = f"⭐ {average:.2f} ({record['rating_count']} votos)" if average is not None else "Sin votos"
+            if record.get('title'):
+                lines.append(f"**-** {record['title']} ({record['year']}) · {rating} - ([Ver reseñas]({thread_url}))")
+            else:
+                lines.append(f"- Película (ID: {imdb_id}) · {rating} ([Ver reseñas]({thread_url}))")
+
+        if len(lines) == 1:
+            lines.append("No hay películas que coincidan con el filtro.")
+        return "\n".join(lines)
+
+    async def _refresh(self, interaction):
+        # La página sale solo del almacén local: se responde con una única edición
+        await interaction.response.edit_message(content=await self.render(), view=self)
+
+    async def interaction_check(self, interaction: discord.Interaction):
+        if interaction.user.id != self.author_id:
+            await interaction.response.send_message("❌ Usa `!lista` para abrir tu propia lista.", ephemeral=True, delete_after=5)
+            return False
+        return True
+
+    async def on_timeout(self):
+        if self.message:
+            try:
+                await self.message.delete()
+            except (discord.NotFound, discord.Forbidden):
+                pass
+
+    @discord.ui.select(placeholder="Ordenar", row=0, options=[
+        discord.SelectOption(label=label, value=value) for value, label in SORTS.items()
+    ])
+    async def sort_select(self, interaction: discord.Interaction, select: discord.ui.Select):
+        self.sort = select.values[0]
+        self._apply_sort_and_filter()
+        await self._refresh(interaction)
+
+    @discord.ui.select(placeholder="Filtrar por calificación", row=1, options=[
+        discord.SelectOption(label=label, value=value) for value, label in FILTERS.items()
+    ])
+    async def filter_select(self, interaction: discord.Interaction, select: discord.ui.Select):
+        self.min_rating = int(select.values[0])
+        self._apply_sort_and_filter()
+        await self._refresh(interaction)
+
+    @discord.ui.button(label='◀ Anterior', style=discord.ButtonStyle.gray, row=2)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.page = max(0, self.page - 1)
+        await self._refresh(interaction)
+
+    @discord.ui.button(label='Siguiente ▶', style=discord.ButtonStyle.gray, row=2)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.page = min(self.page_count - 1, self.page + 1)
+        await self._refresh(interaction)
 
 # --- 4. Event Handlers ---
 
 @bot.event
 async def on_ready():
-    """Runs when the bot connects to Discord."""
+    """Runs on every (re)connection; state and views are set up once, in setup_hook."""
     print(f'¡El bot {bot.user} está listo y funcionando!')
-    load_rated_movies()
-    load_rated_users()
-    bot.add_view(MovieReviewView())
+
+def passes_throttle(message):
+    """Applies the per-user and per-channel limits; False means the message is not processed."""
+    verdict, scope = user_throttle.check(message.author.id), 'user'
+    if verdict == ALLOWED:
+        verdict, scope = channel_throttle.check(message.channel.id), 'channel'
+    if verdict == ALLOWED:
+        return True
+
+    THROTTLED.inc(scope, verdict)
+    # Un solo aviso por racha; lo demás se ignora sin responder
+    if verdict == REJECTED and scope == 'user':
+        moderation.warn(message.channel, message.author, 'throttled')
+    return False
 
 @bot.event
 async def on_message(message):
@@ -262,25 +687,30 @@ async def on_message(message):
     if message.author.bot:
         return
 
+    in_thread = isinstance(message.channel, discord.Thread)
+    in_permitted_channel = message.guild is not None and message.channel.id == guild_config(message.guild.id)['channel_id']
+    if not (in_thread or in_permitted_channel or message.content.startswith(bot.command_prefix)):
+        return
+    if not passes_throttle(message):
+        # Borrarlo no cuesta una llamada extra: va en el mismo borrado masivo
+        if in_thread or in_permitted_channel:
+            moderation.delete(message)
+        return
+
     # Delete any user message in a review thread
-    if isinstance(message.channel, discord.Thread):
-        try:
-            await message.delete()
-        except (discord.NotFound, discord.Forbidden):
-            pass
+    if in_thread:
+        moderation.delete(message)
         return
 
     # Delete non-command messages in the permitted channel
-    if message.channel.id == PERMITTED_CHANNEL_ID:
-        is_command = message.content.startswith(('!rate', '!buscar', '!lista'))
-        
+    if in_permitted_channel:
+        is_command = message.content.startswith(('!rate', '!buscar', '!lista', '!recalcular', '!promociones', '!recargar'))
+
         if not is_command:
-            try:
-                await message.delete()
-                await message.channel.send(f"❌ Para interactuar en este canal, por favor usa los comandos permitidos (`!rate`, `!buscar`, `!lista`).", delete_after=10)
-            except (discord.errors.NotFound, discord.Forbidden):
-                pass
-        
+            moderation.delete(message)
+            moderation.warn(message.channel, message.author, 'rules')
+            return
+
     await bot.process_commands(message)
     
 @bot.event
@@ -289,24 +719,43 @@ async def on_reaction_add(reaction, user):
     if user == bot.user:
         return
 
-    if reaction.message.channel.id == PERMITTED_CHANNEL_ID or isinstance(reaction.message.channel, discord.Thread):
-        try:
-            await reaction.message.remove_reaction(reaction.emoji, user)
-        except discord.errors.Forbidden:
-            print("Error: No tengo permisos para eliminar reacciones.")
-        except Exception as e:
-            print(f"Ocurrió un error inesperado al intentar eliminar una reacción: {e}")
+    guild = reaction.message.guild
+    in_permitted_channel = guild is not None and reaction.message.channel.id == guild_config(guild.id)['channel_id']
+    if in_permitted_channel or isinstance(reaction.message.channel, discord.Thread):
+        # El bot no reacciona nunca: se quitan todas las reacciones del mensaje de una vez
+        moderation.clear_reactions(reaction.message)
+
+@bot.before_invoke
+async def start_command_timer(ctx):
+    """Marks when a command starts, for the latency histogram, and holds it until the state is loaded."""
+    ctx.started_at = time.perf_counter()
+    await state_ready.wait()
+
+@bot.event
+async def on_command_completion(ctx):
+    """Records how long a command took."""
+    COMMAND_SECONDS.observe(time.perf_counter() - ctx.started_at, ctx.command.name)
 
 @bot.event
 async def on_command_error(ctx, error):
     """Handles command-related errors."""
+    command_name = ctx.command.name if ctx.command else 'desconocido'
+    COMMAND_ERRORS.inc(command_name, type(error).__name__)
+    if hasattr(ctx, 'started_at'):
+        COMMAND_SECONDS.observe(time.perf_counter() - ctx.started_at, command_name)
+
     try:
         await ctx.message.delete()
     except (discord.errors.NotFound, discord.Forbidden):
         pass
 
-    if isinstance(error, commands.CheckFailure):
-        permitted_channel = bot.get_channel(PERMITTED_CHANNEL_ID)
+    # MissingPermissions y MissingRole son también CheckFailure: se revisan antes
+    if isinstance(error, commands.MissingPermissions):
+        await ctx.send("❌ Lo siento, solo los administradores pueden usar este comando.", delete_after=10)
+    elif isinstance(error, commands.MissingRole):
+        await ctx.send("❌ Lo siento, no tienes el rol necesario para usar este comando.", delete_after=10)
+    elif isinstance(error, commands.CheckFailure):
+        permitted_channel = bot.get_channel(guild_config(ctx.guild.id)['channel_id']) if ctx.guild else None
         if permitted_channel:
             channel_name = permitted_channel.name
             await ctx.send(f"❌ Lo siento, este comando solo se puede usar en el canal **#{channel_name}**.", delete_after=10)
@@ -314,8 +763,6 @@ async def on_command_error(ctx, error):
             await ctx.send("❌ Lo siento, este comando solo se puede usar en un canal designado.", delete_after=10)
     elif isinstance(error, commands.MissingRequiredArgument):
         await ctx.send(f"❌ Faltan argumentos. Uso: `!{ctx.command.name} \"<título de la película>\"`", delete_after=10)
-    elif isinstance(error, commands.MissingRole):
-        await ctx.send("❌ Lo siento, no tienes el rol necesario para usar este comando.", delete_after=10)
     elif isinstance(error, commands.CommandNotFound):
         await ctx.send("❌ Ese comando no existe. Revisa la lista de comandos disponibles.", delete_after=10)
     else:
@@ -324,100 +771,121 @@ async def on_command_error(ctx, error):
 # --- 5. Commands ---
 
 @bot.command(name='rate')
-@commands.has_role(MOVIE_ROLE_ID)
+@commands.check(has_movie_role)
 @commands.check(is_in_specific_channel)
 async def rate_movie(ctx, *, title: str):
     try:
         await ctx.message.delete()
     except discord.errors.NotFound:
         pass
+    movies = guild_movies(ctx.guild.id)
     
     # Check for direct IMDb ID input first
     if re.match(r'^tt\d{7,8}$', title.lower()) is not None:
         imdb_id = title.lower()
-        if imdb_id in rated_movies:
-            thread = ctx.guild.get_thread(rated_movies[imdb_id])
+        if imdb_id in movies:
+            thread = ctx.guild.get_thread(movies[imdb_id]['thread_id'])
             if thread:
                 await ctx.send(f"❌ La película **'{imdb_id}'** ya ha sido calificada. Ver reseñas aquí: {thread.jump_url}", delete_after=10)
                 return
         
         try:
-            movie_data = requests.get(f'http://www.omdbapi.com/?i={imdb_id}&apikey={OMDB_API_KEY}').json()
+            movie_data = await omdb.get_by_id(imdb_id)
             if movie_data.get('Response') == 'True':
                 await create_movie_review_thread(ctx.channel, ctx.author, movie_data)
             else:
                 await ctx.send(f"❌ No se encontró una película con el ID de IMDb **'{imdb_id}'**.", delete_after=10)
-        except requests.exceptions.RequestException:
+        except OMDbError:
             await ctx.send("❌ Ocurrió un error al buscar la película por ID.", delete_after=10)
         return
 
-    # If not a direct ID, perform a search
-    all_movies = []
-    page = 1
-    while len(all_movies) < 50: # Limit search to 5 pages
-        try:
-            search_data = requests.get(f'http://www.omdbapi.com/?s={title}&type=movie&apikey={OMDB_API_KEY}&page={page}').json()
-        except requests.exceptions.RequestException:
-            await ctx.send("❌ Ocurrió un error con la API de películas.", delete_after=10)
-            return
-        
-        if search_data.get('Response') == 'False':
-            break
-        
-        for movie in search_data.get('Search', []):
-            if movie.get('imdbID') and movie.get('imdbID') not in [m.get('imdbID') for m in all_movies]:
-                all_movies.append(movie)
-
-        if len(all_movies) >= int(search_data.get('totalResults', 0)):
-            break
-        page += 1
-        await asyncio.sleep(0.5)
+    # If not a direct ID, perform a search. Page 1 is shown right away and the
+    # remaining pages are fetched concurrently and merged into the same message.
+    try:
+        first_page = await omdb.search(title, page=1)
+    except OMDbThrottled:
+        await ctx.send("⏳ Hay demasiadas búsquedas en curso. Intenta de nuevo en unos segundos.", delete_after=10)
+        return
+    except OMDbError:
+        await ctx.send("❌ Ocurrió un error con la API de películas.", delete_after=10)
+        return
 
-    if not all_movies:
+    if first_page.get('Response') == 'False' or not first_page.get('Search'):
         await ctx.send(f"❌ Lo siento, no pude encontrar ninguna película con el título **'{title}'**.", delete_after=10)
         return
 
-    # Process and filter the movies
     def get_year_for_sort(movie):
         year_str = movie.get('Year', '0')
         match = re.search(r'\d{4}', year_str)
         return int(match.group(0)) if match else 0
-        
-    all_movies.sort(key=get_year_for_sort, reverse=True)
 
+    seen_ids = set()
     valid_movies = []
     already_rated_links = []
-    
-    for movie in all_movies:
-        imdb_id = movie.get('imdbID')
-        if imdb_id and imdb_id.lower().strip() in rated_movies:
-            thread = ctx.guild.get_thread(rated_movies[imdb_id.lower().strip()])
-            if thread:
-                already_rated_links.append(f"**'{movie.get('Title')} ({movie.get('Year')})'** ([Ver reseñas]({thread.jump_url}))")
-        elif len(valid_movies) < 20: # Limit the main list to 20 movies
-            valid_movies.append(movie)
 
-    if not valid_movies and not already_rated_links:
+    def add_results(search_data):
+        # Los números ya mostrados no cambian: cada página nueva se agrega al final
+        new_movies = []
+        for movie in search_data.get('Search', []):
+            imdb_id = movie.get('imdbID')
+            if imdb_id and imdb_id not in seen_ids:
+                seen_ids.add(imdb_id)
+                new_movies.append(movie)
+        new_movies.sort(key=get_year_for_sort, reverse=True)
+
+        for movie in new_movies:
+            imdb_id = movie.get('imdbID').lower().strip()
+            if imdb_id in movies:
+                thread = ctx.guild.get_thread(movies[imdb_id]['thread_id'])
+                if thread:
+                    already_rated_links.append(f"**'{movie.get('Title')} ({movie.get('Year')})'** ([Ver reseñas]({thread.jump_url}))")
+            elif len(valid_movies) < 20: # Limit the main list to 20 movies
+                valid_movies.append(movie)
+
+    def build_results_message(searching):
+        lines = [f"Resultados para **'{title}'**. Responde con el número para calificar:"]
+
+        if valid_movies:
+            lines.append("\n".join([f"**{i + 1}.** {m.get('Title')} ({m.get('Year')})" for i, m in enumerate(valid_movies)]))
+        elif not searching:
+            lines.append("❌ No se encontraron películas sin calificar.")
+
+        if searching:
+            lines.append("🔎 Buscando más resultados...")
+
+        lines.append("\n---")
+
+        if already_rated_links:
+            lines.append("\n**Películas ya calificadas:**")
+            lines.append("\n".join(already_rated_links))
+
+        lines.append("\nSi tu película no está aquí, busca con un título más específico o introduce el ID de IMDb directamente.")
+        return "\n".join(lines)
+
+    add_results(first_page)
+    last_page = min(SEARCH_MAX_PAGES, -(-int(first_page.get('totalResults', 0)) // 10))
+
+    if last_page <= 1 and not valid_movies and not already_rated_links:
         await ctx.send(f"❌ No se encontraron resultados válidos (con IMDb ID) para **'{title}'**.", delete_after=10)
         return
-        
-    # Build and send the single, unified message
-    lines = [f"Resultados para **'{title}'**. Responde con el número para calificar:"]
 
-    if valid_movies:
-        lines.append("\n".join([f"**{i + 1}.** {m.get('Title')} ({m.get('Year')})" for i, m in enumerate(valid_movies)]))
-    else:
-        lines.append("❌ No se encontraron películas sin calificar.")
-    
-    lines.append("\n---")
-    
-    if already_rated_links:
-        lines.append("\n**Películas ya calificadas:**")
-        lines.append("\n".join(already_rated_links))
+    message_to_delete = await ctx.send(build_results_message(searching=last_page > 1))
 
-    lines.append("\nSi tu película no está aquí, busca con un título más específico o introduce el ID de IMDb directamente.")
-    
-    message_to_delete = await ctx.send("\n".join(lines))
+    async def fetch_remaining_pages():
+        # El cliente de OMDb limita cuántas de estas peticiones van en paralelo
+        pages = await asyncio.gather(
+            *(omdb.search(title, page=page) for page in range(2, last_page + 1)),
+            return_exceptions=True
+        )
+        for search_data in pages:
+            if isinstance(search_data, dict) and search_data.get('Response') == 'True':
+                add_results(search_data)
+        try:
+            await message_to_delete.edit(content=build_results_message(searching=False))
+        except discord.NotFound:
+            pass
+
+    prefetch_task = asyncio.create_task(fetch_remaining_pages()) if last_page > 1 else None
 
     def check(m): 
         is_valid_id = re.match(r'^tt\d{7,8}$', m.content.lower()) is not None
@@ -430,32 +898,33 @@ async def rate_movie(ctx, *, title: str):
 
         if re.match(r'^tt\d{7,8}$', user_input) is not None:
             imdb_id = user_input
-            if imdb_id in rated_movies:
-                thread = ctx.guild.get_thread(rated_movies[imdb_id])
+            if imdb_id in movies:
+                thread = ctx.guild.get_thread(movies[imdb_id]['thread_id'])
                 if thread:
                     await ctx.send(f"❌ La película **'{imdb_id}'** ya ha sido calificada. Ver reseñas aquí: {thread.jump_url}", delete_after=10)
                     return
             
             try:
-                movie_data = requests.get(f'http://www.omdbapi.com/?i={imdb_id}&apikey={OMDB_API_KEY}').json()
+                movie_data = await omdb.get_by_id(imdb_id)
                 if movie_data.get('Response') == 'True':
                     await create_movie_review_thread(ctx.channel, ctx.author, movie_data)
                 else:
                     await ctx.send(f"❌ No se encontró una película con el ID de IMDb **'{imdb_id}'**.", delete_after=10)
-            except requests.exceptions.RequestException:
+            except OMDbError:
                 await ctx.send("❌ Ocurrió un error al buscar la película por ID.", delete_after=10)
         else:
             selected_index = int(user_input) - 1
             if 0 <= selected_index < len(valid_movies):
-                selected_movie_id = valid_movies[selected_index].get('imdbID')
-                selected_movie_data = requests.get(f'http://www.omdbapi.com/?i={selected_movie_id}&apikey={OMDB_API_KEY}').json()
-                await create_movie_review_thread(ctx.channel, ctx.author, selected_movie_data)
+                # El resultado de búsqueda ya trae Title, Poster e imdbID; no hace falta pedir ?i=
+                await create_movie_review_thread(ctx.channel, ctx.author, valid_movies[selected_index])
             else:
                 await ctx.send("❌ Selección inválida. Ingresa un número de la lista o un ID de IMDb.", delete_after=10)
             
     except (asyncio.TimeoutError, ValueError):
         await ctx.send("⌛ Tiempo agotado o respuesta inválida. Usa `!rate` de nuevo.", delete_after=10)
     finally:
+        if prefetch_task:
+            prefetch_task.cancel()
         if message_to_delete: 
             try: await message_to_delete.delete()
             except discord.errors.NotFound: pass
@@ -468,26 +937,53 @@ async def rate_movie(ctx, *, title: str):
 async def find_movie(ctx, *, title: str):
     try: await ctx.message.delete()
     except discord.NotFound: pass
+    movies = guild_movies(ctx.guild.id)
+
+    # Primero se busca entre las películas ya calificadas; OMDb solo se omite si una coincide claramente
+    local_matches = guild_search_index(ctx.guild.id).search(title)
+    local_message = ""
+    if local_matches:
+        local_message = f"Resultados para **'{title}'** entre las películas calificadas:\n"
+        for imdb_id, _ in local_matches:
+            record = movies[imdb_id]
+            average = average_rating(record)
+            rating = f"⭐ {average:.2f}/5" if average is not None else "sin votos aún"
+            thread_url = f"https://discord.com/channels/{ctx.guild.id}/{record['thread_id']}"
+            name = f"{record['title']} ({record['year']})" if record.get('title') else f"ID: {imdb_id}"
+            local_message += f" **'{name}'** ({rating}). Ver reseñas: {thread_url}\n"
+
+    if local_matches and local_matches[0][1] >= STRONG_MATCH_SCORE:
+        local_message += "Si no es la que buscas, usa `!rate` con un título más específico o el ID de IMDb."
+        await ctx.send(local_message, delete_after=30)
+        return
 
     try:
-        search_data = requests.get(f'http://www.omdbapi.com/?s={title}&type=movie&apikey={OMDB_API_KEY}').json()
-    except requests.exceptions.RequestException:
-        await ctx.send("Error al conectar con la API de películas.", delete_after=10)
+        search_data = await omdb.search(title)
+    except OMDbThrottled:
+        await ctx.send(local_message + "⏳ Hay demasiadas búsquedas en curso. Intenta de nuevo en unos segundos.", delete_after=10)
+        return
+    except OMDbError:
+        await ctx.send(local_message + "Error al conectar con la API de películas.", delete_after=10)
         return
 
     if search_data.get('Response') == 'True' and search_data.get('Search'):
-        response_message = f"Resultados para **'{title}'**:\n"
-        
+        response_message = local_message + f"Resultados para **'{title}'** en OMDb:\n"
+        listed = {imdb_id for imdb_id, _ in local_matches}
+
         for movie in search_data.get('Search', []):
             imdb_id = movie.get('imdbID')
-            if imdb_id and imdb_id.lower().strip() in rated_movies:
-                thread = ctx.guild.get_thread(rated_movies[imdb_id.lower().strip()])
+            if imdb_id and imdb_id.lower().strip() in listed:
+                continue
+            if imdb_id and imdb_id.lower().strip() in movies:
+                thread = ctx.guild.get_thread(movies[imdb_id.lower().strip()]['thread_id'])
                 if thread:
                     response_message += f" **'{movie.get('Title')} ({movie.get('Year')})'** ya ha sido calificada. Ver reseñas: {thread.jump_url}\n"
             else:
                 response_message += f" **'{movie.get('Title')} ({movie.get('Year')})'** aún no tiene reseñas. Usa `!rate` para calificarla.\n"
         
         await ctx.send(response_message, delete_after=30)
+    elif local_message:
+        await ctx.send(local_message + f"OMDb no encontró otras películas con el título **'{title}'**.", delete_after=30)
     else:
         await ctx.send(f"La película **'{title}'** no ha sido calificada o no se encontró.", delete_after=10)
     
@@ -496,42 +992,76 @@ async def find_movie(ctx, *, title: str):
 async def list_movies(ctx):
     try: await ctx.message.delete()
     except discord.NotFound: pass
-    load_rated_movies()
+    movies = guild_movies(ctx.guild.id)
 
-    if not rated_movies:
+    if not movies:
         await ctx.send("No hay películas calificadas.", delete_after=10)
         return
 
-    message_content = "**🎥 Películas calificadas:**\n\n"
-    
-    # Invertir el diccionario para mostrar las últimas películas primero
-    reversed_movies = dict(reversed(rated_movies.items()))
+    view = MovieListView(ctx.author.id, ctx.guild.id)
+    view.message = await ctx.send(await view.render(), view=view)
 
-    for imdb_id, thread_id in reversed_movies.items():
-        thread = ctx.guild.get_thread(thread_id)
-        if thread:
-            try:
-                # Obtener la información de la película de la API de OMDB usando el imdb_id
-                movie_data = requests.get(f'http://www.omdbapi.com/?i={imdb_id}&apikey={OMDB_API_KEY}').json()
-                if movie_data.get('Response') == 'True':
-                    movie_title = movie_data.get('Title')
-                    movie_year = movie_data.get('Year')
-                    line = f"**-** {movie_title} ({movie_year}) - ([Ver reseñas]({thread.jump_url}))\n"
-                else:
-                    line = f"- Película (ID: {imdb_id}) ([Ver reseñas]({thread.jump_url}))\n"
-            except (requests.exceptions.RequestException, Exception):
-                line = f"- Película (ID: {imdb_id}) ([Ver reseñas]({thread.jump_url}))\n"
-            
-            # Verificar si añadir la siguiente línea superaría el límite de caracteres
-            if len(message_content) + len(line) > 2000:
-                await ctx.send(message_content)
-                message_content = line
-            else:
-                message_content += line
-    
-    if message_content:
-        await ctx.send(message_content, delete_after=30)
+@bot.command(name='recalcular')
+@commands.has_permissions(administrator=True)
+@commands.check(is_in_specific_channel)
+async def backfill_ratings(ctx):
+    """Rebuilds the running rating totals of every thread from its full history (one-off)."""
+    try: await ctx.message.delete()
+    except discord.NotFound: pass
+    movies = guild_movies(ctx.guild.id)
+
+    status_message = await ctx.send(f"⏳ Recalculando calificaciones de {len(movies)} películas...")
+    updated = 0
+    for imdb_id, record in list(movies.items()):
+        try:
+            thread = ctx.guild.get_thread(record['thread_id']) or await bot.fetch_channel(record['thread_id'])
+        except discord.HTTPException:
+            continue
+
+        ratings = []
+        async for message in thread.history(limit=None):
+            if message.author == bot.user and message.content:
+                match = REVIEW_RATING_PATTERN.search(message.content)
+                if match and 1 <= int(match.group(1)) <= 5:
+                    ratings.append(int(match.group(1)))
+
+        record['rating_sum'] = sum(ratings)
+        record['rating_count'] = len(ratings)
+        storage.save_rating(record['thread_id'], record['rating_sum'], record['rating_count'])
+        await update_average_rating(thread)
+        updated += 1
+
+    await status_message.edit(content=f"✅ Calificaciones recalculadas para {updated} películas.", delete_after=30)
+
+@bot.command(name='promociones')
+@commands.has_permissions(administrator=True)
+@commands.check(is_in_specific_channel)
+async def promotion_status(ctx):
+    """Shows the progress of the promotion DM queue."""
+    try: await ctx.message.delete()
+    except discord.NotFound: pass
+
+    await ctx.send(f"📨 Promociones: {promotions.status()}", delete_after=30)
+
+@bot.command(name='recargar')
+@commands.has_permissions(administrator=True)
+@commands.check(is_in_specific_channel)
+async def reload_state(ctx):
+    """Reloads movies and votes from storage after they were edited outside the bot."""
+    try: await ctx.message.delete()
+    except discord.NotFound: pass
+
+    # Los votos que lleguen desde aquí esperan a la recarga; lo pendiente se escribe antes de releer
+    state_ready.clear()
+    try:
+        await storage.flush()
+        await load_state()
+    except Exception:
+        # La lectura no tocó el estado anterior: se sigue usando
+        state_ready.set()
+        raise
+    await ctx.send(f"🔄 Datos recargados: {sum(map(len, rated_movies.values()))} películas y {len(rated_users_db)} hilos con votos.", delete_after=10)
 
 # --- 6. Bot Run ---
-import os
-bot.run(os.getenv("DISCORD_TOKEN"))
\ No newline at end of file
+if __name__ == '__main__':
+    bot.run(os.getenv("DISCORD_TOKEN"))
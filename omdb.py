@@ -0,0 +1,149 @@
+import asyncio
+import random
+
+import aiohttp
+
+from metrics import OMDB_CACHE, OMDB_REQUESTS, OMDB_SECONDS, THROTTLED
+from throttle import ALLOWED
+
+OMDB_URL = 'http://www.omdbapi.com/'
+
+
+def normalize_query(title):
+    """Normalizes a search query so equivalent searches share a cache entry."""
+    return ' '.join(title.lower().split())
+
+
+class OMDbError(Exception):
+    """Raised when OMDb can't be reached or returns an unreadable response."""
+
+
+class OMDbThrottled(OMDbError):
+    """Raised instead of sending a request when the shared OMDb budget is used up."""
+
+
+class OMDbClient:
+    """Async OMDb client sharing one keep-alive connection pool."""
+
+    def __init__(self, api_key, timeout=10, max_concurrency=4, retries=3, backoff=0.5,
+                 cache=None, details_ttl=7 * 24 * 3600, search_ttl=24 * 3600, cache_save_delay=60,
+                 base_url=OMDB_URL, throttle=None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.cache = cache
+        self.details_ttl = details_ttl
+        self.search_ttl = search_ttl
+        self.cache_save_delay = cache_save_delay
+        # Cubo de tokens global (throttle.Throttle); las respuestas de la caché no gastan tokens
+        self.throttle = throttle
+        self._session = None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._save_task = None
+
+    async def start(self):
+        """Opens the shared HTTP session if it isn't open yet."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=30)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+
+    async def close(self):
+        """Closes the shared HTTP session and persists the cache."""
+        if self._save_task is not None:
+            self._save_task.cancel()
+            self._save_task = None
+        if self.cache is not None and self.cache.dirty:
+            await self._save_cache()
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def _save_cache(self):
+        snapshot = self.cache.snapshot()
+        self.cache.dirty = False
+        await asyncio.to_thread(self.cache.save, snapshot)
+
+    async def _delayed_save(self):
+        await asyncio.sleep(self.cache_save_delay)
+        self._save_task = None
+        await self._save_cache()
+
+    def _cache_get(self, key, endpoint):
+        if self.cache is None:
+            return None
+        value = self.cache.get(key)
+        OMDB_CACHE.inc(endpoint, 'hit' if value is not None else 'miss')
+        return value
+
+    def _cache_put(self, key, value, ttl):
+        # Solo se guardan respuestas válidas; los errores (p. ej. límite diario) no se cachean
+        if self.cache is None or value.get('Response') != 'True':
+            return
+        self.cache.put(key, value, ttl)
+        if self._save_task is None:
+            self._save_task = asyncio.create_task(self._delayed_save())
+
+    async def _request(self, params, endpoint):
+        verdict = self.throttle.check('omdb') if self.throttle is not None else ALLOWED
+        if verdict != ALLOWED:
+            THROTTLED.inc('omdb', verdict)
+            raise OMDbThrottled("Límite de peticiones a OMDb alcanzado")
+        with OMDB_SECONDS.time(endpoint):
+            try:
+                data = await self._request_with_retries(params)
+            except OMDbError:
+                OMDB_REQUESTS.inc(endpoint, 'error')
+                raise
+        OMDB_REQUESTS.inc(endpoint, 'ok' if data.get('Response') == 'True' else 'not_found')
+        return data
+
+    async def _request_with_retries(self, params):
+        await self.start()
+        params = {**params, 'apikey': self.api_key}
+
+        for attempt in range(self.retries + 1):
+            try:
+                async with self._semaphore:
+                    async with self._session.get(self.base_url, params=params) as resp:
+                        # 5xx y 429 son transitorios; cualquier otra respuesta trae el JSON de OMDb
+                        if resp.status >= 500 or resp.status == 429:
+                            raise aiohttp.ClientResponseError(
+                                resp.request_info, resp.history, status=resp.status, message=resp.reason
+                            )
+                        return await resp.json(content_type=None)
+            except ValueError as e:
+                raise OMDbError(f"Respuesta inválida de OMDb: {e}") from e
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == self.retries:
+                    raise OMDbError(f"No se pudo contactar con OMDb: {e!r}") from e
+                await asyncio.sleep(self.backoff * 2 ** attempt + random.uniform(0, self.backoff))
+
+    async def search(self, title, page=1):
+        """Searches movies by title, returning the raw OMDb search payload."""
+        key = f"s:{normalize_query(title)}:{page}"
+        cached = self._cache_get(key, 'search')
+        if cached is not None:
+            return cached
+        data = await self._request({'s': title, 'type': 'movie', 'page': page}, 'search')
+        self._cache_put(key, data, self.search_ttl)
+        return data
+
+    def has_details(self, imdb_id):
+        """True if the details for an IMDb ID are cached and still fresh (no request needed)."""
+        return self.cache is not None and self.cache.get(f"i:{imdb_id.lower().strip()}") is not None
+
+    async def get_by_id(self, imdb_id):
+        """Fetches the full OMDb record for an IMDb ID."""
+        key = f"i:{imdb_id.lower().strip()}"
+        cached = self._cache_get(key, 'details')
+        if cached is not None:
+            return cached
+        data = await self._request({'i': imdb_id}, 'details')
+        self._cache_put(key, data, self.details_ttl)
+        return data
@@ -0,0 +1,167 @@
+import asyncio
+import json
+import time
+
+import discord
+
+from metrics import RATE_LIMITS
+from storage import atomic_write_json
+
+
+def format_promotion(role_name, movies):
+    """Builds the DM text for one or more pending movie promotions."""
+    if len(movies) == 1:
+        movie_name, thread_url = movies[0]
+        return (f"Hola, hemos visto que tienes el rol de **{role_name}**.\n\n"
+                f"¿Ya viste y calificaste **'{movie_name}'**?\n\n"
+                f"¡Es tu momento de dejar tu reseña! Puedes hacerlo directamente aquí: {thread_url}")
+    lines = "\n".join(f"- **'{movie_name}'**: {thread_url}" for movie_name, thread_url in movies)
+    return (f"Hola, hemos visto que tienes el rol de **{role_name}**.\n\n"
+            f"¿Ya viste y calificaste estas películas?\n{lines}\n\n"
+            f"¡Es tu momento de dejar tu reseña!")
+
+
+class PromotionQueue:
+    """Background queue that DMs movie promotions, persisted so it resumes after a restart.
+
+    Each member has at most one pending DM; overlapping promotions are merged into it.
+    The pause between DMs doubles whenever Discord rate-limits us and shrinks back
+    slowly while sends go through. Members whose DMs are closed are skipped from then on.
+    """
+
+    def __init__(self, bot, path, delay=1.0, min_delay=0.5, max_delay=60.0, slow_response=2.0,
+                 save_every=20, report_every=50):
+        self.bot = bot
+        self.path = path
+        self.delay = delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.slow_response = slow_response
+        self.save_every = save_every
+        self.report_every = report_every
+        self.pending = {}
+        self.blocked = set()
+        self.sent = 0
+        self.failed = 0
+        self._wakeup = asyncio.Event()
+        self._save_lock = asyncio.Lock()
+        self._task = None
+
+    def load(self):
+        """Loads pending DMs and blocked members from disk."""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        self.pending = {int(k): v for k, v in data.get('pending', {}).items()}
+        self.blocked = set(data.get('blocked', []))
+
+    async def save(self):
+        """Persists the queue off the event loop, one save at a time."""
+        # La instantánea se toma dentro del lock: el último guardado en terminar es siempre el más reciente
+        async with self._save_lock:
+            snapshot = {
+                'pending': {str(k): {'role': v['role'], 'movies': [list(m) for m in v['movies']]}
+                            for k, v in self.pending.items()},
+                'blocked': list(self.blocked),
+            }
+            try:
+                await asyncio.to_thread(atomic_write_json, self.path, snapshot)
+            except OSError as e:
+                print(f"Error al guardar la cola de promociones: {e}")
+
+    async def enqueue(self, members, role_name, movie_name, thread_url):
+        """Queues a promotion DM for every member; returns how many were added."""
+        added = 0
+        for member in members:
+            if member.bot or member.id in self.blocked:
+                continue
+            entry = self.pending.setdefault(member.id, {'role': role_name, 'movies': []})
+            if [movie_name, thread_url] not in entry['movies']:
+                entry['movies'].append([movie_name, thread_url])
+                added += 1
+
+        await self.save()
+        self._wakeup.set()
+        print(f"Promoción de '{movie_name}': {added} mensajes en cola ({len(self.pending)} pendientes).")
+        return added
+
+    def status(self):
+        """Returns a one-line progress summary."""
+        return (f"{self.sent} enviados, {self.failed} fallidos, {len(self.pending)} pendientes, "
+                f"{len(self.blocked)} con DMs cerrados (pausa actual: {self.delay:.1f}s)")
+
+    def start(self):
+        """Starts the background sender."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stops the background sender and persists what is left."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.save()
+
+    async def _run(self):
+        await self.bot.wait_until_ready()
+        since_save = 0
+        while True:
+            if not self.pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            user_id = next(iter(self.pending))
+            await self._deliver(user_id)
+
+            since_save += 1
+            if since_save >= self.save_every or not self.pending:
+                await self.save()
+                since_save = 0
+            if (self.sent + self.failed) % self.report_every == 0 or not self.pending:
+                print(f"Promociones: {self.status()}")
+            await asyncio.sleep(self.delay)
+
+    async def _deliver(self, user_id):
+        entry = self.pending[user_id]
+        movies = list(entry['movies'])
+        started = time.monotonic()
+        try:
+            user = self.bot.get_user(user_id) or await self.bot.fetch_user(user_id)
+            await user.send(format_promotion(entry['role'], movies))
+        except discord.Forbidden:
+            self.blocked.add(user_id)
+            self.pending.pop(user_id, None)
+            self.failed += 1
+            return
+        except discord.HTTPException as e:
+            if e.status == 429:
+                # Se queda en la cola y se reintenta con una pausa mayor
+                RATE_LIMITS.inc('promotions')
+                self.delay = min(self.max_delay, self.delay * 2)
+                return
+            self.pending.pop(user_id, None)
+            self.failed += 1
+            return
+        except Exception as e:
+            print(f"Error inesperado al enviar una promoción a {user_id}: {e}")
+            self.pending.pop(user_id, None)
+            self.failed += 1
+            return
+
+        # Pudieron llegar nuevas películas para este miembro mientras se enviaba
+        remaining = [m for m in entry['movies'] if m not in movies]
+        if remaining:
+            entry['movies'] = remaining
+        else:
+            self.pending.pop(user_id, None)
+        self.sent += 1
+
+        # discord.py espera por su cuenta los 429; una respuesta lenta indica que estamos en el límite
+        if time.monotonic() - started > self.slow_response:
+            RATE_LIMITS.inc('promotions_slow')
+            self.delay = min(self.max_delay, self.delay * 2)
+        else:
+            self.delay = max(self.min_delay, self.delay * 0.9)
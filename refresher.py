@@ -0,0 +1,117 @@
+import asyncio
+import datetime
+import time
+
+from metrics import METADATA_REFRESHES
+from omdb import OMDbError, OMDbThrottled
+
+
+class MetadataRefresher:
+    """Background task that fills in and refreshes the OMDb metadata of rated movies.
+
+    A movie needs work when its record has no title yet or its details are no longer in
+    the OMDb cache. Untitled movies go first, then the ones viewed most recently. Requests
+    that miss the cache count against `daily_quota` (reset at midnight UTC); a movie is
+    retried at most once every `retry_after` seconds, so missing IDs don't eat the budget.
+    """
+
+    def __init__(self, client, movies, apply, daily_quota=300, retry_after=24 * 3600, pause=5.0,
+                 batch_size=20, idle=600):
+        self.client = client
+        self.movies = movies
+        self.apply = apply
+        self.daily_quota = daily_quota
+        self.retry_after = retry_after
+        self.pause = pause
+        self.batch_size = batch_size
+        self.idle = idle
+        self.used_today = 0
+        self._day = None
+        self._viewed = {}
+        self._attempted = {}
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def mark_viewed(self, guild_key, imdb_id, record):
+        """Records that a movie was just shown to someone, so it is refreshed before the rest."""
+        self._viewed[(guild_key, imdb_id)] = time.time()
+        if not record.get('title'):
+            self._wakeup.set()
+
+    def start(self):
+        """Starts the background refresh loop."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _take_quota(self):
+        today = datetime.datetime.now(datetime.timezone.utc).date()
+        if today != self._day:
+            self._day = today
+            self.used_today = 0
+        if self.used_today >= self.daily_quota:
+            return False
+        self.used_today += 1
+        return True
+
+    def _candidates(self):
+        now = time.time()
+        candidates = []
+        for guild_key, imdb_id, record in self.movies():
+            key = (guild_key, imdb_id)
+            if now - self._attempted.get(key, 0) < self.retry_after:
+                continue
+            if record.get('title') and self.client.has_details(imdb_id):
+                continue
+            candidates.append((bool(record.get('title')), -self._viewed.get(key, 0), key, record))
+        candidates.sort(key=lambda c: c[:2])
+        return [(key, record) for _, _, key, record in candidates[:self.batch_size]]
+
+    async def _run(self):
+        while True:
+            batch = self._candidates()
+            if not batch:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.idle)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            for (guild_key, imdb_id), record in batch:
+                cached = self.client.has_details(imdb_id)
+                if not cached and not self._take_quota():
+                    # Cupo diario agotado: se sigue al día siguiente
+                    tomorrow = datetime.datetime.combine(self._day + datetime.timedelta(days=1), datetime.time(),
+                                                         datetime.timezone.utc)
+                    await asyncio.sleep((tomorrow - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+                    break
+                await self._refresh(guild_key, imdb_id, record, cached)
+                if not cached:
+                    await asyncio.sleep(self.pause)
+
+    async def _refresh(self, guild_key, imdb_id, record, cached):
+        try:
+            movie_data = await self.client.get_by_id(imdb_id)
+        except OMDbThrottled:
+            # Los comandos tienen prioridad sobre el presupuesto compartido de OMDb
+            if not cached:
+                self.used_today -= 1
+            METADATA_REFRESHES.inc('throttled')
+            await asyncio.sleep(self.pause * 6)
+            return
+        except OMDbError:
+            self._attempted[(guild_key, imdb_id)] = time.time()
+            METADATA_REFRESHES.inc('error')
+            return
+
+        self._attempted[(guild_key, imdb_id)] = time.time()
+        if movie_data.get('Response') != 'True':
+            METADATA_REFRESHES.inc('not_found')
+            return
+        self.apply(imdb_id, record, movie_data)
+        METADATA_REFRESHES.inc('cached' if cached else 'fetched')
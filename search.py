@@ -0,0 +1,109 @@
+import re
+import unicodedata
+from collections import defaultdict
+
+YEAR_PATTERN = re.compile(r'(?:19|20)\d\d')
+
+# Callers treat a match at least this good as certain (1.0 = same normalized title)
+STRONG_MATCH_SCORE = 0.8
+# Shorter queries ('the', 'man') appear inside too many titles to count as substring matches
+MIN_SUBSTRING_QUERY = 4
+# A title containing the query ranks high, but below a sure match
+SUBSTRING_SCORE = 0.75
+# A year in the query lifts titles from that year; a different year keeps even an exact title below a sure match
+YEAR_BONUS = 0.2
+YEAR_PENALTY = 0.25
+
+
+def normalize(text):
+    """Lowercases, strips accents and punctuation so 'Amélie!' matches 'amelie'."""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(re.findall(r'\w+', text.lower()))
+
+
+def trigrams(text):
+    """Returns the set of character trigrams of an already normalized text."""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class MovieSearchIndex:
+    """In-memory fuzzy index over rated movies.
+
+    Titles are indexed by character trigrams (typo tolerant, scored with the Dice
+    coefficient) and review texts by word, so a query can match either.
+    """
+
+    def __init__(self, min_score=0.45):
+        self.min_score = min_score
+        self._titles = {}
+        self._title_grams = defaultdict(set)
+        self._review_words = defaultdict(set)
+
+    def __len__(self):
+        return len(self._titles)
+
+    def add_movie(self, imdb_id, title, year=None):
+        """Indexes (or re-indexes) a movie title."""
+        old = self._titles.pop(imdb_id, None)
+        if old:
+            for gram in old[2]:
+                self._title_grams[gram].discard(imdb_id)
+
+        normalized = normalize(title)
+        if not normalized:
+            return
+        grams = trigrams(normalized)
+        self._titles[imdb_id] = (normalized, year or '', grams)
+        for gram in grams:
+            self._title_grams[gram].add(imdb_id)
+
+    def add_review(self, imdb_id, text):
+        """Indexes the words of a review left for a movie."""
+        for word in set(normalize(text).split()):
+            if len(word) > 2:
+                self._review_words[word].add(imdb_id)
+
+    def search(self, query, limit=10):
+        """Returns up to `limit` (imdb_id, score) pairs, best match first."""
+        normalized = normalize(query)
+        if not normalized:
+            return []
+
+        words = normalized.split()
+        year = next((w for w in words if YEAR_PATTERN.fullmatch(w)), None)
+        title_query = ' '.join(w for w in words if w != year) or normalized
+        query_grams = trigrams(title_query)
+
+        shared = defaultdict(int)
+        for gram in query_grams:
+            for imdb_id in self._title_grams.get(gram, ()):
+                shared[imdb_id] += 1
+
+        scores = {}
+        for imdb_id, count in shared.items():
+            title, _, grams = self._titles[imdb_id]
+            score = 2 * count / (len(query_grams) + len(grams))
+            if len(title_query) >= MIN_SUBSTRING_QUERY and title_query in title:
+                score = max(score, SUBSTRING_SCORE)
+            scores[imdb_id] = score
+
+        # Las reseñas cuentan menos que el título: hace falta que aparezcan casi todas las palabras
+        content_words = [w for w in words if len(w) > 2 and w != year]
+        if content_words:
+            hits = defaultdict(int)
+            for word in content_words:
+                for imdb_id in self._review_words.get(word, ()):
+                    hits[imdb_id] += 1
+            for imdb_id, count in hits.items():
+                scores[imdb_id] = max(scores.get(imdb_id, 0), 0.5 * count / len(content_words))
+
+        if year:
+            for imdb_id in scores:
+                movie = self._titles.get(imdb_id)
+                if movie:
+                    scores[imdb_id] += YEAR_BONUS if year in movie[1] else -YEAR_PENALTY
+
+        ranked = sorted(((i, s) for i, s in scores.items() if s >= self.min_score), key=lambda r: r[1], reverse=True)
+        return ranked[:limit]
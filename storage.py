@@ -0,0 +1,456 @@
+import asyncio
+import json
+import os
+import sqlite3
+import tempfile
+import time
+
+from metrics import PERSIST_FLUSHED, PERSIST_FLUSH_SECONDS
+from votes import VoteRegistry
+
+
+def new_movie_record(thread_id, title=None, year=None, poster=None, created_at=None, message_id=None, channel_id=None,
+                     guild_id=0):
+    """Builds the rated-movie record stored for each imdbID of a guild."""
+    # Un hilo creado desde un mensaje comparte su ID con el mensaje inicial
+    return {
+        'guild_id': guild_id,
+        'thread_id': int(thread_id),
+        'message_id': int(message_id or thread_id),
+        'channel_id': channel_id,
+        'title': title,
+        'year': year,
+        'poster': poster,
+        'created_at': created_at,
+        'rating_sum': 0,
+        'rating_count': 0,
+    }
+
+
+def atomic_write_json(path, data, indent=4):
+    """Writes JSON to a temp file, fsyncs it and renames it over `path`."""
+    # Un temporal único por escritura: dos guardados simultáneos nunca comparten archivo
+    fd, tmp_path = tempfile.mkstemp(prefix=f"{os.path.basename(path)}.", suffix='.tmp',
+                                    dir=os.path.dirname(path) or '.')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def json_movie_key(guild_id, imdb_id):
+    """Key of a movie in the JSON file; the original server (guild 0) keeps bare imdbIDs."""
+    return imdb_id if not guild_id else f"{guild_id}:{imdb_id}"
+
+
+def read_json_movies(path, strict=False):
+    """Reads a rated movies JSON file, migrating the old imdbID -> thread id format.
+
+    Returns (imdb_id, record) pairs in file order and whether any entry had to be migrated.
+    A corrupt file reads as empty unless `strict`, in which case the JSONDecodeError is raised.
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return [], False
+    except json.JSONDecodeError:
+        if strict:
+            raise
+        return [], False
+
+    migrated = False
+    movies = []
+    for key, value in data.items():
+        guild_id, _, imdb_id = key.rpartition(':')
+        if isinstance(value, dict):
+            record = new_movie_record(value['thread_id'])
+            record.update(value)
+        else:
+            # Formato antiguo: solo el ID del hilo. MetadataRefresher completa título y año en segundo plano
+            record = new_movie_record(value)
+            migrated = True
+        record['guild_id'] = int(guild_id or 0)
+        movies.append((imdb_id, record))
+    return movies, migrated
+
+
+def read_json_votes(path, strict=False):
+    """Reads a rated users JSON file into thread id -> set of user ids (see read_json_movies for `strict`)."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except json.JSONDecodeError:
+        if strict:
+            raise
+        return {}
+    return {int(k): set(v) for k, v in data.items()}
+
+
+class JSONStorage:
+    """Legacy backend that rewrites the whole JSON files on every flush."""
+
+    def __init__(self, movies_path, users_path):
+        self.movies_path = movies_path
+        self.users_path = users_path
+        self.movies = {}
+        self.votes = VoteRegistry()
+
+    def load_movies(self):
+        movies, migrated = read_json_movies(self.movies_path)
+        self.movies = {json_movie_key(record['guild_id'], imdb_id): record for imdb_id, record in movies}
+        if migrated:
+            atomic_write_json(self.movies_path, self.movies)
+        # Copias: el bot modifica las suyas y este backend solo cambia por prepare()
+        return [(imdb_id, dict(record)) for imdb_id, record in movies]
+
+    def load_votes(self):
+        votes = read_json_votes(self.users_path)
+        pairs = [(thread_id, user_id) for thread_id, users in votes.items() for user_id in users]
+        self.votes = VoteRegistry.from_pairs(pairs)
+        return VoteRegistry.from_pairs(pairs)
+
+    def load_reviews(self):
+        # El formato JSON no guarda el texto de las reseñas
+        return []
+
+    def prepare(self, ops):
+        """Applies queued writes to the in-memory copy and snapshots the files they touch."""
+        movies_changed = votes_changed = False
+        for kind, args in ops:
+            if kind == 'movie':
+                imdb_id, record = args
+                self.movies[json_movie_key(record['guild_id'], imdb_id)] = record
+                movies_changed = True
+            elif kind == 'vote':
+                thread_id, user_id, _rating, _review = args
+                self.votes.add(thread_id, user_id)
+                votes_changed = True
+            elif kind == 'rating':
+                # Los totales viven dentro del registro de la película
+                thread_id, rating_sum, rating_count = args
+                for record in self.movies.values():
+                    if record['thread_id'] == thread_id:
+                        record['rating_sum'] = rating_sum
+                        record['rating_count'] = rating_count
+                movies_changed = True
+
+        movies = {k: dict(v) for k, v in self.movies.items()} if movies_changed else None
+        votes = self.votes.to_json() if votes_changed else None
+        return movies, votes
+
+    def commit(self, snapshot):
+        """Writes a snapshot taken by prepare(); runs in a worker thread."""
+        movies, votes = snapshot
+        if movies is not None:
+            atomic_write_json(self.movies_path, movies)
+        if votes is not None:
+            atomic_write_json(self.users_path, votes)
+
+    def close(self):
+        pass
+
+
+class SQLiteStorage:
+    """SQLite backend (WAL mode) with one upsert per changed row."""
+
+    MOVIES_TABLE = '''
+        CREATE TABLE IF NOT EXISTS movies (
+            guild_id INTEGER NOT NULL DEFAULT 0,
+            imdb_id TEXT NOT NULL,
+            thread_id INTEGER NOT NULL UNIQUE,
+            message_id INTEGER,
+            channel_id INTEGER,
+            title TEXT,
+            year TEXT,
+            poster TEXT,
+            created_at TEXT,
+            PRIMARY KEY (guild_id, imdb_id)
+        )
+    '''
+
+    SCHEMA = MOVIES_TABLE + ''';
+        CREATE TABLE IF NOT EXISTS votes (
+            thread_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            rating INTEGER,
+            review TEXT,
+            PRIMARY KEY (thread_id, user_id)
+        );
+        CREATE TABLE IF NOT EXISTS ratings (
+            thread_id INTEGER PRIMARY KEY,
+            rating_sum INTEGER NOT NULL DEFAULT 0,
+            rating_count INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+    '''
+
+    def __init__(self, path, import_movies_path=None, import_users_path=None, votes_snapshot_path=None):
+        self.path = path
+        self.votes_snapshot_path = votes_snapshot_path
+        self._votes = None
+        # Las escrituras se hacen desde un hilo de trabajo, una a la vez (ver WriteBehindStorage)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        # Varios procesos (shards) pueden compartir la base: se espera al bloqueo en lugar de fallar
+        self.conn.execute('PRAGMA busy_timeout=5000')
+        self._migrate_movies_table()
+        self.conn.executescript(self.SCHEMA)
+        self._import_json(import_movies_path, import_users_path)
+
+    def _migrate_movies_table(self):
+        """Adds the guild_id column (part of the primary key) to databases created before multi-guild mode."""
+        with self.conn:
+            # Otro shard puede estar abriendo la misma base: se comprueba con el bloqueo de escritura tomado
+            self.conn.execute('BEGIN IMMEDIATE')
+            columns = [row[1] for row in self.conn.execute('PRAGMA table_info(movies)')]
+            if not columns or 'guild_id' in columns:
+                return
+            self.conn.execute('ALTER TABLE movies RENAME TO movies_old')
+            self.conn.execute(self.MOVIES_TABLE)
+            self.conn.execute('''
+                INSERT INTO movies (guild_id, imdb_id, thread_id, message_id, channel_id, title, year, poster, created_at)
+                SELECT 0, imdb_id, thread_id, message_id, channel_id, title, year, poster, created_at
+                FROM movies_old ORDER BY rowid
+            ''')
+            self.conn.execute('DROP TABLE movies_old')
+
+    def _import_json(self, movies_path, users_path):
+        """Imports the legacy JSON files once, the first time the database is opened."""
+        if self.conn.execute("SELECT 1 FROM meta WHERE key = 'json_imported'").fetchone():
+            return
+
+        try:
+            movies, _ = read_json_movies(movies_path, strict=True) if movies_path else ([], False)
+            votes = read_json_votes(users_path, strict=True) if users_path else {}
+        except json.JSONDecodeError as e:
+            # Sin marcar la importación: se reintenta en el próximo arranque, una vez reparado el archivo
+            print(f"Error: los archivos JSON a importar están dañados ({e}). Repáralos o muévelos y reinicia el bot.")
+            raise
+        with self.conn:
+            self.conn.execute('BEGIN IMMEDIATE')
+            # Otro shard pudo importar mientras se leían los archivos
+            if self.conn.execute("SELECT 1 FROM meta WHERE key = 'json_imported'").fetchone():
+                return
+            for imdb_id, record in movies:
+                self._upsert_movie(imdb_id, record)
+                self._upsert_rating(record['thread_id'], record['rating_sum'], record['rating_count'])
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO votes (thread_id, user_id) VALUES (?, ?)',
+                [(thread_id, user_id) for thread_id, users in votes.items() for user_id in users]
+            )
+            self.conn.execute("INSERT INTO meta (key, value) VALUES ('json_imported', '1')")
+        if movies or votes:
+            print(f"Importadas {len(movies)} películas y {sum(map(len, votes.values()))} votos desde JSON.")
+
+    def load_movies(self):
+        rows = self.conn.execute('''
+            SELECT m.guild_id, m.imdb_id, m.thread_id, m.message_id, m.channel_id, m.title, m.year, m.poster,
+                   m.created_at, COALESCE(r.rating_sum, 0), COALESCE(r.rating_count, 0)
+            FROM movies m LEFT JOIN ratings r ON r.thread_id = m.thread_id
+            ORDER BY m.rowid
+        ''')
+        movies = []
+        for guild_id, imdb_id, thread_id, message_id, channel_id, title, year, poster, created_at, rating_sum, rating_count in rows:
+            record = new_movie_record(thread_id, title, year, poster, created_at, message_id, channel_id, guild_id)
+            record['rating_sum'] = rating_sum
+            record['rating_count'] = rating_count
+            movies.append((imdb_id, record))
+        return movies
+
+    def load_votes(self):
+        """Loads the vote registry from its binary snapshot if it still matches the table, else from SQLite."""
+        votes = None
+        if self.votes_snapshot_path:
+            votes = VoteRegistry.load(self.votes_snapshot_path, self._votes_stamp())
+        if votes is None:
+            votes = VoteRegistry.from_pairs(self.conn.execute('SELECT thread_id, user_id FROM votes'))
+        # El bot sigue añadiendo votos a este mismo registro; close() lo guarda como snapshot
+        self._votes = votes
+        return votes
+
+    def _votes_stamp(self):
+        # Un voto nuevo o reemplazado (INSERT OR REPLACE) siempre recibe un rowid mayor
+        return self.conn.execute('SELECT COUNT(*), COALESCE(MAX(rowid), 0) FROM votes').fetchone()
+
+    def load_reviews(self):
+        return self.conn.execute('SELECT thread_id, review FROM votes WHERE review IS NOT NULL').fetchall()
+
+    def prepare(self, ops):
+        return ops
+
+    def commit(self, ops):
+        """Writes a batch of queued changes in a single transaction; runs in a worker thread."""
+        with self.conn:
+            for kind, args in ops:
+                if kind == 'movie':
+                    self._upsert_movie(*args)
+                elif kind == 'vote':
+                    self.conn.execute(
+                        'INSERT OR REPLACE INTO votes (thread_id, user_id, rating, review) VALUES (?, ?, ?, ?)',
+                        args
+                    )
+                elif kind == 'rating':
+                    self._upsert_rating(*args)
+
+    def close(self):
+        if self._votes is not None and self.votes_snapshot_path:
+            stamp = self._votes_stamp()
+            # Si algún voto no llegó a la base, el snapshot no se guarda y el próximo arranque lee la tabla
+            if stamp[0] == self._votes.total_votes:
+                try:
+                    self._votes.save(self.votes_snapshot_path, stamp)
+                except OSError as e:
+                    print(f"No se pudo guardar el snapshot de votos: {e}")
+        self.conn.close()
+
+    def _upsert_movie(self, imdb_id, record):
+        self.conn.execute('''
+            INSERT INTO movies (guild_id, imdb_id, thread_id, message_id, channel_id, title, year, poster, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(guild_id, imdb_id) DO UPDATE SET
+                thread_id = excluded.thread_id, message_id = excluded.message_id,
+                channel_id = excluded.channel_id, title = excluded.title, year = excluded.year,
+                poster = excluded.poster, created_at = excluded.created_at
+        ''', (record['guild_id'], imdb_id, record['thread_id'], record['message_id'], record['channel_id'],
+              record['title'], record['year'], record['poster'], record['created_at']))
+
+    def _upsert_rating(self, thread_id, rating_sum, rating_count):
+        self.conn.execute('''
+            INSERT INTO ratings (thread_id, rating_sum, rating_count) VALUES (?, ?, ?)
+            ON CONFLICT(thread_id) DO UPDATE SET
+                rating_sum = excluded.rating_sum, rating_count = excluded.rating_count
+        ''', (thread_id, rating_sum, rating_count))
+
+
+class WriteBehindStorage:
+    """Queues writes in memory and flushes them to a backend in batches, off the event loop.
+
+    A flush runs `flush_interval` seconds after the first pending change, or as soon as
+    `max_pending` changes are queued. Repeated writes to the same row are coalesced.
+    """
+
+    def __init__(self, backend, flush_interval=2.0, max_pending=100):
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending = {}
+        self._timer = None
+        self._flush_task = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def pending_changes(self):
+        return len(self._pending)
+
+    def load_movies(self):
+        """Returns (imdb_id, record) pairs for every guild, oldest first."""
+        return self.backend.load_movies()
+
+    def load_votes(self):
+        """Returns the VoteRegistry of who already voted in each thread."""
+        return self.backend.load_votes()
+
+    def load_reviews(self):
+        """Returns (thread_id, review text) pairs for every stored review."""
+        return self.backend.load_reviews()
+
+    def save_movie(self, imdb_id, record):
+        self._queue(('movie', record['guild_id'], imdb_id), (imdb_id, dict(record)))
+
+    def save_vote(self, thread_id, user_id, rating=None, review=None):
+        self._queue(('vote', thread_id, user_id), (thread_id, user_id, rating, review))
+
+    def save_rating(self, thread_id, rating_sum, rating_count):
+        self._queue(('rating', thread_id), (thread_id, rating_sum, rating_count))
+
+    def _queue(self, key, args):
+        self._pending.pop(key, None)
+        self._pending[key] = args
+        if len(self._pending) >= self.max_pending:
+            if self._flush_task is None:
+                self._cancel_timer()
+                self._flush_task = asyncio.get_running_loop().create_task(self._flush_full())
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().create_task(self._flush_later())
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        self._timer = None
+        await self.flush()
+
+    async def _flush_full(self):
+        try:
+            await self.flush()
+        finally:
+            self._flush_task = None
+        # Lo que llegó mientras se escribía el lote sale con el temporizador normal
+        if self._pending and self._timer is None:
+            self._timer = asyncio.get_running_loop().create_task(self._flush_later())
+
+    async def flush(self):
+        """Writes every pending change to the backend."""
+        async with self._lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, {}
+            ops = [(key[0], args) for key, args in batch.items()]
+            started = time.perf_counter()
+            try:
+                payload = self.backend.prepare(ops)
+                await asyncio.to_thread(self.backend.commit, payload)
+                PERSIST_FLUSHED.inc('ok', amount=len(ops))
+            except Exception as e:
+                PERSIST_FLUSHED.inc('error', amount=len(ops))
+                print(f"Error al guardar {len(ops)} cambios pendientes: {e}")
+                # Se reintentan en el próximo flush, sin pisar cambios más recientes
+                for key, args in batch.items():
+                    self._pending.setdefault(key, args)
+                if self._timer is None:
+                    self._timer = asyncio.get_running_loop().create_task(self._flush_later())
+            finally:
+                PERSIST_FLUSH_SECONDS.observe(time.perf_counter() - started)
+
+    async def close(self):
+        """Flushes pending changes and closes the backend."""
+        self._cancel_timer()
+        await self.flush()
+        self.backend.close()
+
+
+def open_storage(backend, db_path, movies_path, users_path, flush_interval=2.0, max_pending=100,
+                 votes_snapshot_path=None, sharded=False):
+    """Opens the configured storage backend ('sqlite' or 'json') behind a write-behind queue.
+
+    The json backend rewrites whole files from one process's memory, so it is refused when
+    the bot runs as several shard processes that would overwrite each other's data.
+    """
+    if backend == 'json':
+        if sharded:
+            raise ValueError("El backend 'json' no admite varios procesos de shards: usa NUNI_STORAGE=sqlite")
+        store = JSONStorage(movies_path, users_path)
+    elif backend == 'sqlite':
+        store = SQLiteStorage(db_path, import_movies_path=movies_path, import_users_path=users_path,
+                              votes_snapshot_path=votes_snapshot_path)
+    else:
+        raise ValueError(f"Backend de almacenamiento desconocido: {backend!r}")
+    return WriteBehindStorage(store, flush_interval=flush_interval, max_pending=max_pending)
@@ -0,0 +1,62 @@
+import pytest
+
+from search import STRONG_MATCH_SCORE, MovieSearchIndex
+
+
+@pytest.fixture
+def index():
+    index = MovieSearchIndex()
+    index.add_movie('tt0133093', 'The Matrix', '1999')
+    index.add_movie('tt1877830', 'The Batman', '2022')
+    index.add_movie('tt0103776', 'Batman Returns', '1992')
+    index.add_movie('tt0211915', 'Amélie', '2001')
+    index.add_review('tt0211915', 'Una película preciosa sobre París')
+    return index
+
+
+def best(index, query):
+    matches = index.search(query)
+    return matches[0] if matches else (None, 0)
+
+
+@pytest.mark.parametrize('query, imdb_id', [
+    ('the matrix', 'tt0133093'),
+    ('The Matrix!', 'tt0133093'),
+    ('the matrix 1999', 'tt0133093'),
+    ('matrix 1999', 'tt0133093'),
+    ('the batman', 'tt1877830'),
+    ('batman returns', 'tt0103776'),
+    ('amelie', 'tt0211915'),
+])
+def test_strong_matches_skip_omdb(index, query, imdb_id):
+    match, score = best(index, query)
+    assert match == imdb_id
+    assert score >= STRONG_MATCH_SCORE
+
+
+@pytest.mark.parametrize('query, imdb_id', [
+    # Contiene el título pero puede ser otra película (Matrix Reloaded, Batman de 1989...)
+    ('matrix', 'tt0133093'),
+    ('batman', None),
+    # Título exacto con otro año: puede ser una nueva versión
+    ('the matrix 2003', 'tt0133093'),
+    ('the matrx', 'tt0133093'),
+    ('paris preciosa', 'tt0211915'),
+])
+def test_weak_matches_fall_through_to_omdb(index, query, imdb_id):
+    match, score = best(index, query)
+    if imdb_id is not None:
+        assert match == imdb_id
+    assert 0 < score < STRONG_MATCH_SCORE
+
+
+@pytest.mark.parametrize('query', ['man', 'the', ''])
+def test_short_queries_are_not_substring_matches(index, query):
+    assert all(score < STRONG_MATCH_SCORE for _, score in index.search(query))
+
+
+def test_reindexing_a_movie_replaces_its_title(index):
+    index.add_movie('tt0133093', 'Matrix Reloaded', '2003')
+
+    assert best(index, 'matrix reloaded') == ('tt0133093', 1.0)
+    assert best(index, 'the matrix')[1] < STRONG_MATCH_SCORE
@@ -0,0 +1,132 @@
+import json
+import multiprocessing
+import sqlite3
+
+from storage import SQLiteStorage
+
+# Esquema de la tabla movies antes del modo multiservidor
+OLD_MOVIES_TABLE = '''
+    CREATE TABLE movies (
+        imdb_id TEXT PRIMARY KEY,
+        thread_id INTEGER NOT NULL UNIQUE,
+        message_id INTEGER,
+        channel_id INTEGER,
+        title TEXT,
+        year TEXT,
+        poster TEXT,
+        created_at TEXT
+    )
+'''
+
+OLD_ROWS = [
+    ('tt0000003', 300, 300, 7, 'Tercera', '2003', None, '2024-01-03'),
+    ('tt0000001', 100, 100, 7, 'Primera', '2001', 'http://poster/1', '2024-01-01'),
+    ('tt0000002', 200, 201, 7, None, None, None, None),
+]
+
+
+def create_old_database(path):
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute(OLD_MOVIES_TABLE)
+        conn.executemany('INSERT INTO movies VALUES (?, ?, ?, ?, ?, ?, ?, ?)', OLD_ROWS)
+        conn.execute('CREATE TABLE votes (thread_id INTEGER NOT NULL, user_id INTEGER NOT NULL, rating INTEGER, '
+                     'review TEXT, PRIMARY KEY (thread_id, user_id))')
+        conn.execute("INSERT INTO votes VALUES (100, 1, 5, 'Muy buena')")
+        conn.execute('CREATE TABLE ratings (thread_id INTEGER PRIMARY KEY, rating_sum INTEGER NOT NULL DEFAULT 0, '
+                     'rating_count INTEGER NOT NULL DEFAULT 0)')
+        conn.execute('INSERT INTO ratings VALUES (100, 5, 1)')
+        conn.execute('CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)')
+        conn.execute("INSERT INTO meta VALUES ('json_imported', '1')")
+    conn.close()
+
+
+def test_migrates_pre_multi_guild_movies_table(tmp_path):
+    path = str(tmp_path / 'nuni.db')
+    create_old_database(path)
+
+    store = SQLiteStorage(path)
+    movies = store.load_movies()
+
+    assert [imdb_id for imdb_id, _ in movies] == ['tt0000003', 'tt0000001', 'tt0000002']
+    assert all(record['guild_id'] == 0 for _, record in movies)
+    first = dict(movies)['tt0000001']
+    assert (first['thread_id'], first['message_id'], first['channel_id']) == (100, 100, 7)
+    assert (first['title'], first['year'], first['poster'], first['created_at']) == \
+        ('Primera', '2001', 'http://poster/1', '2024-01-01')
+    assert (first['rating_sum'], first['rating_count']) == (5, 1)
+    assert dict(movies)['tt0000002']['message_id'] == 201
+
+    columns = [row[1] for row in store.conn.execute('PRAGMA table_info(movies)')]
+    assert columns[0] == 'guild_id'
+    assert store.conn.execute("SELECT name FROM sqlite_master WHERE name = 'movies_old'").fetchone() is None
+    assert store.load_votes().has_voted(100, 1)
+    assert store.load_reviews() == [(100, 'Muy buena')]
+    store.close()
+
+
+def test_migrated_database_accepts_other_guilds(tmp_path):
+    path = str(tmp_path / 'nuni.db')
+    create_old_database(path)
+
+    store = SQLiteStorage(path)
+    store.commit([('movie', ('tt0000001', {
+        'guild_id': 55, 'thread_id': 900, 'message_id': 900, 'channel_id': 8, 'title': 'Primera',
+        'year': '2001', 'poster': None, 'created_at': None,
+    }))])
+    store.close()
+
+    # Reabrir una base ya migrada no la vuelve a tocar
+    store = SQLiteStorage(path)
+    keys = [(record['guild_id'], imdb_id) for imdb_id, record in store.load_movies()]
+    assert keys == [(0, 'tt0000003'), (0, 'tt0000001'), (0, 'tt0000002'), (55, 'tt0000001')]
+    store.close()
+
+
+def test_votes_snapshot_is_used_only_while_fresh(tmp_path):
+    path = str(tmp_path / 'nuni.db')
+    snapshot = str(tmp_path / 'votes.bin')
+    create_old_database(path)
+
+    store = SQLiteStorage(path, votes_snapshot_path=snapshot)
+    store.load_votes()
+    store.close()
+
+    store = SQLiteStorage(path, votes_snapshot_path=snapshot)
+    assert store.load_votes().has_voted(100, 1)
+    # Un voto escrito sin pasar por el registro deja el snapshot desfasado
+    store.commit([('vote', (200, 2, 4, None))])
+    store.conn.close()
+
+    store = SQLiteStorage(path, votes_snapshot_path=snapshot)
+    votes = store.load_votes()
+    assert votes.has_voted(200, 2)
+    assert votes.total_votes == 2
+    store.close()
+
+
+def open_shard_storage(path, movies_path, users_path, barrier):
+    barrier.wait()
+    SQLiteStorage(path, movies_path, users_path).close()
+
+
+def test_shards_opening_a_fresh_database_import_json_once(tmp_path):
+    path = str(tmp_path / 'nuni.db')
+    movies_path = tmp_path / 'rated_movies.json'
+    users_path = tmp_path / 'rated_users.json'
+    movies_path.write_text(json.dumps({f"tt{n:07}": {'thread_id': n} for n in range(1, 500)}))
+    users_path.write_text(json.dumps({str(n): [1, 2] for n in range(1, 500)}))
+
+    barrier = multiprocessing.Barrier(4)
+    shards = [multiprocessing.Process(target=open_shard_storage, args=(path, str(movies_path), str(users_path), barrier))
+              for _ in range(4)]
+    for shard in shards:
+        shard.start()
+    for shard in shards:
+        shard.join()
+
+    assert [shard.exitcode for shard in shards] == [0, 0, 0, 0]
+    conn = sqlite3.connect(path)
+    assert conn.execute('SELECT COUNT(*) FROM movies').fetchone() == (499,)
+    assert conn.execute('SELECT COUNT(*) FROM votes').fetchone() == (998,)
+    conn.close()
@@ -0,0 +1,76 @@
+from votes import SNAPSHOT_HEADER, VoteRegistry
+
+
+def build_registry():
+    return VoteRegistry.from_pairs([(10, 3), (10, 1), (20, 2), (10, 2), (30, 2 ** 63)])
+
+
+def test_save_load_round_trip(tmp_path):
+    path = tmp_path / 'votes.bin'
+    registry = build_registry()
+    registry.save(path, stamp=(5, 42))
+
+    loaded = VoteRegistry.load(path, stamp=(5, 42))
+    assert loaded is not None
+    assert sorted(loaded.pairs()) == sorted(registry.pairs())
+    assert len(loaded) == 3
+    assert loaded.total_votes == 5
+    assert loaded.has_voted(30, 2 ** 63)
+    assert not loaded.has_voted(20, 1)
+
+
+def test_loaded_registry_accepts_new_votes(tmp_path):
+    path = tmp_path / 'votes.bin'
+    build_registry().save(path)
+
+    loaded = VoteRegistry.load(path)
+    assert loaded.add(20, 1)
+    assert not loaded.add(10, 2)
+    assert loaded.has_voted(20, 1)
+
+
+def test_empty_registry_round_trip(tmp_path):
+    path = tmp_path / 'votes.bin'
+    VoteRegistry().save(path, stamp=(0, 0))
+
+    loaded = VoteRegistry.load(path, stamp=(0, 0))
+    assert loaded is not None
+    assert len(loaded) == 0
+
+
+def test_stale_stamp_is_rejected(tmp_path):
+    path = tmp_path / 'votes.bin'
+    build_registry().save(path, stamp=(5, 42))
+
+    assert VoteRegistry.load(path, stamp=(6, 43)) is None
+    assert VoteRegistry.load(path, stamp=(5, 41)) is None
+
+
+def test_truncated_file_is_rejected(tmp_path):
+    path = tmp_path / 'votes.bin'
+    build_registry().save(path, stamp=(5, 42))
+    data = path.read_bytes()
+
+    for size in (0, SNAPSHOT_HEADER.size - 1, SNAPSHOT_HEADER.size + 8, len(data) - 8, len(data) - 3):
+        path.write_bytes(data[:size])
+        assert VoteRegistry.load(path, stamp=(5, 42)) is None, size
+
+
+def test_bad_magic_is_rejected(tmp_path):
+    path = tmp_path / 'votes.bin'
+    build_registry().save(path)
+    path.write_bytes(b'XXXXXXXX' + path.read_bytes()[8:])
+
+    assert VoteRegistry.load(path) is None
+
+
+def test_missing_file(tmp_path):
+    assert VoteRegistry.load(tmp_path / 'missing.bin') is None
+
+
+def test_save_leaves_no_temp_files(tmp_path):
+    path = tmp_path / 'votes.bin'
+    build_registry().save(path)
+    build_registry().save(str(path))
+
+    assert [p.name for p in tmp_path.iterdir()] == ['votes.bin']
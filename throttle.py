@@ -0,0 +1,51 @@
+import time
+
+ALLOWED = 'allowed'
+REJECTED = 'rejected'
+SILENCED = 'silenced'
+
+
+class Throttle:
+    """Token buckets keyed by user, channel or any other id, created on first use.
+
+    Each bucket holds up to `burst` tokens and refills at `rate` tokens per second.
+    check() returns REJECTED the first time a key runs dry, so the caller can tell the
+    user once, and SILENCED for every further attempt until a token is available again.
+    """
+
+    def __init__(self, rate, burst, max_keys=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = {}
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def check(self, key, cost=1):
+        """Takes `cost` tokens from the bucket of `key` if it has them; returns the verdict."""
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.max_keys:
+                self._prune(now)
+            bucket = self._buckets[key] = [self.burst, now, False]
+        else:
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+
+        if bucket[0] >= cost:
+            bucket[0] -= cost
+            bucket[2] = False
+            return ALLOWED
+        if bucket[2]:
+            return SILENCED
+        bucket[2] = True
+        return REJECTED
+
+    def _prune(self, now):
+        # Un cubo que ya se habría rellenado entero equivale a uno nuevo
+        full = [key for key, (tokens, updated, _) in self._buckets.items()
+                if tokens + (now - updated) * self.rate >= self.burst]
+        for key in full:
+            del self._buckets[key]
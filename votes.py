@@ -0,0 +1,128 @@
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from bisect import bisect_left
+
+# Caché local de la máquina: el orden de bytes va en la cabecera y un archivo ajeno se ignora
+SNAPSHOT_MAGIC = b'NUNIVOT' + (b'L' if sys.byteorder == 'little' else b'B')
+SNAPSHOT_HEADER = struct.Struct('=8sQQQ')
+
+
+class VoteRegistry:
+    """Who already voted in each review thread, as one sorted array of 64-bit user ids per thread.
+
+    Uses 8 bytes per vote instead of a Python int inside a set, answers membership with
+    a binary search and can be written to / read from a fixed-width binary snapshot.
+    """
+
+    def __init__(self):
+        self._threads = {}
+
+    def __len__(self):
+        return len(self._threads)
+
+    @property
+    def total_votes(self):
+        return sum(map(len, self._threads.values()))
+
+    def clear(self):
+        self._threads.clear()
+
+    def has_voted(self, thread_id, user_id):
+        users = self._threads.get(thread_id)
+        if not users:
+            return False
+        i = bisect_left(users, user_id)
+        return i < len(users) and users[i] == user_id
+
+    def add(self, thread_id, user_id):
+        """Records a vote; returns False if the user had already voted in the thread."""
+        users = self._threads.get(thread_id)
+        if users is None:
+            self._threads[thread_id] = array('Q', (user_id,))
+            return True
+        i = bisect_left(users, user_id)
+        if i < len(users) and users[i] == user_id:
+            return False
+        users.insert(i, user_id)
+        return True
+
+    def pairs(self):
+        """Yields every (thread_id, user_id) vote."""
+        for thread_id, users in self._threads.items():
+            for user_id in users:
+                yield thread_id, user_id
+
+    def to_json(self):
+        """Returns the legacy rated_users_db.json layout (thread id -> list of user ids)."""
+        return {str(thread_id): users.tolist() for thread_id, users in self._threads.items()}
+
+    @classmethod
+    def from_pairs(cls, pairs):
+        """Builds a registry from (thread_id, user_id) pairs in any order."""
+        grouped = {}
+        for thread_id, user_id in pairs:
+            grouped.setdefault(thread_id, set()).add(user_id)
+        registry = cls()
+        registry._threads = {thread_id: array('Q', sorted(users)) for thread_id, users in grouped.items()}
+        return registry
+
+    def save(self, path, stamp=(0, 0)):
+        """Writes a binary snapshot (header, thread table, user ids) tagged with `stamp`."""
+        table = array('Q')
+        users = array('Q')
+        for thread_id, thread_users in self._threads.items():
+            table.extend((thread_id, len(users), len(thread_users)))
+            users.extend(thread_users)
+
+        # Temporal único, como atomic_write_json: varios shards pueden guardar el snapshot a la vez
+        fd, tmp_path = tempfile.mkstemp(prefix=f"{os.path.basename(path)}.", suffix='.tmp',
+                                        dir=os.path.dirname(path) or '.')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, stamp[0], stamp[1], len(self._threads)))
+                table.tofile(f)
+                users.tofile(f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    @classmethod
+    def load(cls, path, stamp=None):
+        """Reads a snapshot written by save(); returns None if it is missing, corrupt or its stamp differs."""
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        if len(data) < SNAPSHOT_HEADER.size:
+            return None
+        magic, stamp_a, stamp_b, thread_count = SNAPSHOT_HEADER.unpack_from(data)
+        if magic != SNAPSHOT_MAGIC or (stamp is not None and (stamp_a, stamp_b) != tuple(stamp)):
+            return None
+
+        values = array('Q')
+        body = memoryview(data)[SNAPSHOT_HEADER.size:]
+        if len(body) % values.itemsize:
+            return None
+        values.frombytes(body)
+        table_end = 3 * thread_count
+        if len(values) < table_end:
+            return None
+
+        registry = cls()
+        for n in range(0, table_end, 3):
+            thread_id, offset, count = values[n], values[n + 1], values[n + 2]
+            start = table_end + offset
+            if start + count > len(values):
+                return None
+            registry._threads[thread_id] = values[start:start + count]
+        return registry